@@ -0,0 +1,65 @@
+"""
+The images and fonts of the game, each loaded when it is first needed.
+
+The tiles drawn for every cell are packed side by side into one atlas
+surface, converted to the pixel format of the display and handed out as
+subsurfaces of it, so that drawing them needs no conversion. Fonts are
+looked up once per name and size.
+"""
+
+import os, pygame
+
+def convert(image):
+    """ Return the image in the pixel format of the display, keeping its
+        transparency; the image itself while no display mode is set """
+    if pygame.display.get_surface() is None:
+        return image
+    return image.convert_alpha()
+
+class Assets():
+    """ Loads the images of a directory and system fonts on demand """
+    def __init__(self, files, atlas=(), directory='.'):
+        """ files maps the names of the images to their files; the images
+            named in atlas are packed into the atlas """
+        self._files = dict(files)
+        self._atlas = tuple(atlas)
+        self._directory = directory
+        self._images = {}   # name -> surface
+        self._fonts = {}    # (name, size) -> font
+
+    def get_image(self, name):
+        """ Return an image, loading it, or the whole atlas, on first use """
+        image = self._images.get(name)
+        if image is None:
+            if name in self._atlas:
+                self._load_atlas()
+            else:
+                self._images[name] = convert(self._load(name))
+            image = self._images[name]
+        return image
+
+    def get_font(self, name, size):
+        """ Return a system font; the fonts of the system are searched
+            only the first time a name and size are asked for """
+        font = self._fonts.get((name, size))
+        if font is None:
+            font = pygame.font.SysFont(name, size)
+            self._fonts[(name, size)] = font
+        return font
+
+    def _load(self, name):
+        return pygame.image.load(os.path.join(self._directory, self._files[name]))
+
+    def _load_atlas(self):
+        images = [self._load(name) for name in self._atlas]
+        atlas = pygame.Surface((sum(image.get_width() for image in images),
+                                max(image.get_height() for image in images)), pygame.SRCALPHA)
+        rects = []
+        left = 0
+        for image in images:
+            # copied as they are, alpha included, rather than blended onto the atlas
+            rects.append(atlas.blit(image, (left, 0), special_flags=pygame.BLEND_RGBA_MAX))
+            left += image.get_width()
+        atlas = convert(atlas)
+        for name, rect in zip(self._atlas, rects):
+            self._images[name] = atlas.subsurface(rect)
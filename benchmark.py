@@ -0,0 +1,185 @@
+"""
+Benchmarks of the hot spots of the game: laying out mines, the flood fill
+of a reveal, drawing the board, marking cells and saving/loading a game,
+across board sizes and mine densities.
+
+The timings are written to a JSON file so that runs can be compared; given
+the file of an earlier run, the suite exits with an error if anything got
+slower by more than the threshold:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --baseline before.json --threshold 0.2
+"""
+
+import argparse, json, os, platform, sqlite3, sys, time, timeit
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')   # draw offscreen, no window needed
+import engine
+
+SIZES = ((9, 9), (16, 30), (100, 100), (500, 500), (1000, 1000), (2000, 2000))
+DENSITIES = (0.12, 0.16, 0.21)      # beginner, intermediate and expert are about these
+MIN_SECONDS = 0.2       # run each benchmark at least this long, setups included...
+MIN_RUNS = 3            # ...and at least this many times
+NOISE_MS = 0.05         # differences below this are never counted as regressions
+MARKS = 1000            # cells marked and unmarked by the marking benchmark
+
+def measure(setup, run):
+    """ Time run(setup()) repeatedly; return the runs' seconds. The setup
+        is not timed, so every run can start from a fresh board. """
+    timer = timeit.default_timer
+    seconds = []
+    end = timer() + MIN_SECONDS
+    while len(seconds) < MIN_RUNS or timer() < end:
+        data = setup()
+        start = timer()
+        run(data)
+        seconds.append(timer() - start)
+    return seconds
+
+def new_minefield(height, width, num_mines, cls=None):
+    if cls is None:
+        cls = engine.Minefield
+    return cls(height, width, num_mines, seed=1, safe_zone=engine.SAFE_NEIGHBORHOOD)
+
+def built_minefield(height, width, num_mines, cls=None):
+    minefield = new_minefield(height, width, num_mines, cls)
+    minefield.build_grid((height // 2, width // 2))
+    return minefield
+
+def bench_build_grid(height, width, num_mines):
+    return measure(lambda: new_minefield(height, width, num_mines),
+                   lambda minefield: minefield.build_grid((height // 2, width // 2)))
+
+def bench_seed_mines(height, width, num_mines):
+    return measure(lambda: new_minefield(height, width, num_mines),
+                   lambda minefield: minefield.seed_mines())
+
+def bench_mass_reveal(height, width, num_mines):
+    # the first click opens an empty cell, so this floods the opening around it
+    return measure(lambda: built_minefield(height, width, num_mines),
+                   lambda minefield: minefield.mass_reveal((height // 2, width // 2)))
+
+def bench_draw(height, width, num_mines):
+    import pygame, minesweeper
+    if not pygame.display.get_init():
+        minesweeper.load_resources()
+        pygame.display.set_mode((1, 1))     # the images are converted to its pixel format
+    # the board as far as a big screen shows it; the rest is clipped
+    surface = pygame.Surface((min(2000, width * (minesweeper.BOXSIZE + minesweeper.GAP)),
+                              min(1200, height * (minesweeper.BOXSIZE + minesweeper.GAP))))
+    minefield = built_minefield(height, width, num_mines, minesweeper.Minefield)
+    minefield.mass_reveal((height // 2, width // 2))
+    return measure(lambda: minefield, lambda minefield: minefield.draw(surface))
+
+def bench_marks(height, width, num_mines):
+    minefield = built_minefield(height, width, num_mines)
+    cells = [divmod(index * 7919 % (height * width), width) for index in range(min(MARKS, height * width))]
+    cells = [(cell, minefield.get_cell(cell[0], cell[1]) == 9, minefield.get_neighbors(cell[0], cell[1]))
+             for cell in set(cells)]
+
+    def cycle(params):
+        # none -> mine -> question -> none, like right-clicking three times
+        for cell, is_mine, neighbors in cells:
+            params.mark_mine(cell, is_mine, neighbors)
+        for cell, is_mine, neighbors in cells:
+            params.unmark_mine(cell, is_mine, neighbors)
+        for cell, is_mine, neighbors in cells:
+            params.unmark_question(cell)
+    return measure(lambda: engine.Game_parameters(num_mines), cycle)
+
+def bench_save_load(height, width, num_mines):
+    import minesweeper
+    minefield = built_minefield(height, width, num_mines)
+    minefield.mass_reveal((height // 2, width // 2))
+    params = engine.Game_parameters(num_mines)
+    for index in range(0, height * width, 97):
+        params.mark_mine(divmod(index, width), False)
+    params.check_first_click()
+    connection = sqlite3.connect(':memory:')
+    cursor = connection.cursor()
+    minesweeper.create_save_table(cursor)
+
+    def round_trip(data):
+        minesweeper.save_game(connection, cursor, minefield, params)
+        grid_data, state_data = minesweeper.retrieve_saved_data(cursor)
+        engine.Minefield(0, 0, 0, grid_data)
+        engine.Game_parameters(0, state_data)
+    return measure(lambda: None, round_trip)
+
+BENCHMARKS = (('build_grid', bench_build_grid),
+              ('seed_mines', bench_seed_mines),
+              ('mass_reveal', bench_mass_reveal),
+              ('draw', bench_draw),
+              ('marks', bench_marks),
+              ('save_load', bench_save_load))
+
+def run(sizes, densities, names, report=None):
+    """ Run the named benchmarks; return {'name/HxW@density': timings} """
+    results = {}
+    for height, width in sizes:
+        for density in densities:
+            num_mines = max(1, int(round(height * width * density)))
+            for name, bench in BENCHMARKS:
+                if name not in names:
+                    continue
+                key = "%s/%dx%d@%g" % (name, height, width, density)
+                seconds = sorted(bench(height, width, num_mines))
+                results[key] = {'median_ms': 1000 * seconds[len(seconds) // 2],
+                                'min_ms': 1000 * seconds[0],
+                                'runs': len(seconds)}
+                if report:
+                    report(key, results[key])
+    return results
+
+def compare(results, baseline, threshold):
+    """ Return (key, baseline ms, new ms) for every benchmark whose median
+        grew by more than threshold (a fraction) over the baseline """
+    regressions = []
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        before = baseline[key]['median_ms']
+        after = results[key]['median_ms']
+        if after > before * (1 + threshold) and after - before > NOISE_MS:
+            regressions.append((key, before, after))
+    return regressions
+
+def parse_size(text):
+    height, width = [int(num) for num in text.split('x')]
+    return (height, width)
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the game's hot spots across board sizes")
+    parser.add_argument('--sizes', nargs='+', type=parse_size, default=list(SIZES), help="HxW")
+    parser.add_argument('--densities', nargs='+', type=float, default=list(DENSITIES))
+    parser.add_argument('--only', nargs='+', default=[name for name, bench in BENCHMARKS],
+                        help="benchmarks to run: " + ", ".join(name for name, bench in BENCHMARKS))
+    parser.add_argument('--output', default='benchmark.json', help="write the timings to this JSON file")
+    parser.add_argument('--baseline', help="JSON file of an earlier run to compare with")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="fail if a median time grew by more than this fraction (default 0.25)")
+    args = parser.parse_args()
+
+    def report(key, timing):
+        print("%-34s %10.3f ms median %10.3f ms min %5d runs" % (key, timing['median_ms'],
+                                                                 timing['min_ms'], timing['runs']))
+        sys.stdout.flush()
+    results = run(args.sizes, args.densities, args.only, report)
+    with open(args.output, 'w') as output:
+        json.dump({'python': platform.python_version(),
+                   'platform': platform.platform(),
+                   'numpy': engine.load_numpy() is not None,
+                   'time': time.strftime("%Y-%m-%d %H:%M:%S"),
+                   'results': results}, output, indent=1, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as source:
+            baseline = json.load(source)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for key, before, after in regressions:
+            print("REGRESSION %-34s %10.3f ms -> %10.3f ms" % (key, before, after))
+        if regressions:
+            sys.exit(1)
+        print("no regressions beyond %d%%" % round(100 * args.threshold))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1139 @@
+"""
+The game logic of Minesweeper, free of any pygame dependency.
+
+The minesweeper.py front end draws on top of these classes; GameEngine
+plays complete games headlessly, e.g. for bots and simulations.
+"""
+
+import bisect, random, threading
+
+# Constants
+NEW_GAME_REFERENCE = {'small': [9, 9, 10],
+                      'medium': [16, 16, 40],
+                      'large': [16, 30, 100]}
+CHUNK_SIZE = 64     # side of the lazily generated tiles of a ChunkedMinefield
+ARRAY_MIN_CELLS = 10000  # boards this big use NumPy storage by default, if available
+# Cells kept free of mines around the first click
+SAFE_CELL = 'cell'                  # only the clicked cell
+SAFE_NEIGHBORHOOD = 'neighborhood'  # the clicked cell and its 3x3 neighborhood
+# Game states reported by GameEngine.status()
+READY = 'ready'        # waiting for the first reveal
+PLAYING = 'playing'
+WON = 'won'
+LOST = 'lost'
+
+np = None           # NumPy, once load_numpy() has imported it
+_numpy_missing = False
+
+def load_numpy():
+    """ Import NumPy on first use, so that importing the engine stays cheap.
+        Return the module, or None if it is not installed. """
+    global np, _numpy_missing
+    if np is None and not _numpy_missing:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            _numpy_missing = True
+    return np
+
+def pack_cells(cells, height, width):
+    """ Return a bitmap with one bit per cell, row by row, most significant
+        bit first (the layout of numpy.packbits), set for the given cells """
+    data = bytearray((height * width + 7) // 8)
+    for row, col in cells:
+        index = row * width + col
+        data[index >> 3] |= 128 >> (index & 7)
+    return bytes(data)
+
+def unpack_cells(data, height, width):
+    """ Return the cells set in a bitmap made by pack_cells, in order """
+    data = bytearray(data)
+    if len(data) != (height * width + 7) // 8:
+        raise ValueError("A bitmap of " + str(len(data)) + " bytes does not fit " +
+                         str(height) + "x" + str(width) + " cells")
+    cells = []
+    for byte_index, byte in enumerate(data):
+        if byte:
+            for bit in range(8):
+                if byte & (128 >> bit):
+                    cells.append(divmod(byte_index * 8 + bit, width))
+    return cells
+
+def sample_indices(state, num_cells, count):
+    """ Return count distinct indices below num_cells drawn with a NumPy
+        RandomState, uniformly: they are the first distinct values of a
+        run of independent draws, made a vector at a time """
+    picks = np.zeros(0, dtype=np.int64)
+    while len(picks) < count:
+        missing = count - len(picks)
+        draws = np.concatenate((picks, state.randint(0, num_cells, missing + missing // 8 + 16)))
+        first = np.unique(draws, return_index=True)[1]
+        picks = draws[np.sort(first)]
+    return picks[:count]
+
+# Main Minesweeper classes
+class Minefield():
+    def __init__(self, height, width, num_mines, saved_field=None, use_arrays=None,
+                 seed=None, safe_zone=SAFE_CELL):
+        """ Initialize a minefield with height number of rows,
+            width number of columns and num_mines number of mines.
+            Optional - pass an existing minefield.
+            Optional - use_arrays selects NumPy-backed storage (int8 hints,
+            bool revealed); by default it is used for boards of at least
+            ARRAY_MIN_CELLS cells whenever NumPy is installed.
+            Optional - seed (a number or a random.Random instance) makes the
+            mine layout reproducible; safe_zone is SAFE_CELL or SAFE_NEIGHBORHOOD. """
+        if saved_field:
+            height, width = saved_field['height'], saved_field['width']
+        if use_arrays is None:
+            use_arrays = height * width >= ARRAY_MIN_CELLS and load_numpy() is not None
+        elif use_arrays and load_numpy() is None:
+            raise ImportError("NumPy is required for array-backed storage")
+        self._use_arrays = use_arrays
+        if seed is None:
+            seed = random.randrange(2 ** 32)    # remember it so the board can be recreated
+        self._seed = seed
+        self._safe_zone = safe_zone
+        self._placed = False                 # mines laid out, see place_mines
+        self._num_revealed = 0               # kept up to date by reveal and mass_reveal
+        if saved_field:
+            # Used to continue a Saved game; if a previous minefield was passed, get its data
+            self.retrieve_state(saved_field)
+        else:  
+            # Set a new minefield according to given width, height and num_mines
+            self._height = height            # minefield dimensions 
+            self._width = width
+            self._num_mines = num_mines      # number of mines in the minefield
+            if self._use_arrays:
+                self._revealed = np.zeros((self._height, self._width), dtype=np.bool_)
+                self._minefield = np.zeros((self._height, self._width), dtype=np.int8)
+            else:
+                self._revealed = [[False for num_rows in range(self._width)] # array of booleans
+                                  for num_cols in range(self._height)]       # holding revealed cells
+                self._minefield = [[0 for num_rows in range(self._width)]  # array of numbers holding
+                                   for num_cols in range(self._height)]    # mines and hint numbers
+        self._size = get_size_name(self._height, self._width, self._num_mines)  # for score tracking purposes
+                                    
+    def __str__(self):
+        info = ""
+        for row in self.get_minefield():
+            info += str(row)
+            info += "\n"
+        return info
+
+    def get_height(self):
+        return self._height
+
+    def get_width(self):
+        return self._width
+
+    def get_num_mines(self):
+        return self._num_mines              
+
+    def get_seed(self):
+        return self._seed
+
+    def set_seed(self, seed):
+        """ Change the seed of a minefield whose mines are not placed yet """
+        self._seed = seed
+
+    def get_safe_zone(self):
+        return self._safe_zone
+
+    def get_cell(self, row, col):
+        """ Return the hint number of a cell (9 for a mine) """
+        return self._minefield[row][col]
+
+    def is_revealed(self, row, col):
+        return self._revealed[row][col]
+
+    def get_num_revealed(self):
+        return self._num_revealed
+
+    def get_minefield(self):
+        """ Return the hint numbers as a list of lists, whatever the storage """
+        if self._use_arrays:
+            return self._minefield.tolist()
+        return self._minefield
+
+    def get_revealed(self):
+        """ Return the revealed cells as a list of lists of booleans """
+        if self._use_arrays:
+            return self._revealed.tolist()
+        return self._revealed
+
+    def get_neighbors(self, row, col):
+        """ Return all neighbor cells to cell in row, col as a list of tuples """
+        ans = []
+        if row > 0:
+            ans.append((row - 1, col))
+        if row < self._height - 1:
+            ans.append((row + 1, col))
+        if col > 0:
+            ans.append((row, col - 1))
+        if col < self._width - 1:
+            ans.append((row, col + 1))
+        if (row > 0) and (col > 0):
+            ans.append((row - 1, col - 1))
+        if (row > 0) and (col < self._width - 1):
+            ans.append((row - 1, col + 1))
+        if (row < self._height - 1) and (col > 0):
+            ans.append((row + 1, col - 1))
+        if (row < self._height - 1) and (col < self._width - 1):
+            ans.append((row + 1, col + 1))
+        return ans
+
+    def build_grid(self, cell_clicked):
+        """ Build a two-dimensional array where 0 represents an empty space,
+            9 represents a mine, and numbers 1 - 8 inform how many mines
+            there are nearby. The mines are laid out over the whole board,
+            unless place_mines already did that ahead of time, and then moved
+            out of the safe zone around cell_clicked. """
+        if not self._placed:
+            self.place_mines()
+        self.relocate_mines(cell_clicked)
+
+    def place_mines(self, rng=None):
+        """ Lay the mines out anywhere and fill in the hint numbers. This does
+            not depend on the first click, so it can be done in advance, e.g.
+            in a background thread while a menu is showing. """
+        self.seed_mines(rng)
+        self.compute_hints()
+        self._placed = True
+
+    def compute_hints(self):
+        """ Fill in the hint numbers around the mines, which must be the only
+            non-zero cells. Array storage does it in a single vectorized pass,
+            summing the eight shifted views of a zero-padded mine mask. """
+        if not self._use_arrays:
+            # every mine adds one to each of its neighbors that is not a mine
+            for row, col in self._mine_locs:
+                for n_row in range(max(row - 1, 0), min(row + 2, self._height)):
+                    hints = self._minefield[n_row]
+                    for n_col in range(max(col - 1, 0), min(col + 2, self._width)):
+                        if hints[n_col] != 9:
+                            hints[n_col] += 1
+            return
+        mines = self._minefield == 9
+        padded = np.zeros((self._height + 2, self._width + 2), dtype=np.int8)
+        padded[1:-1, 1:-1] = mines
+        counts = np.zeros((self._height, self._width), dtype=np.int8)
+        for d_row in (0, 1, 2):
+            for d_col in (0, 1, 2):
+                if d_row == 1 and d_col == 1:
+                    continue
+                counts += padded[d_row:d_row + self._height, d_col:d_col + self._width]
+        counts[mines] = 9
+        self._minefield = counts
+
+    def seed_mines(self, rng=None):
+        """ Update self._minefield with self._num_mines placed randomly.
+            All mines are drawn at once, so the cost does not depend on the
+            mine density. rng may be a seed or a random.Random instance and
+            defaults to the minefield's seed; it is kept for relocate_mines.
+            Array storage draws the positions with NumPy, seeded from rng, so
+            its layouts differ from those of list storage for the same seed. """
+        if rng is None:
+            rng = self._seed
+        if not isinstance(rng, random.Random):
+            rng = random.Random(rng)
+        self._rng = rng
+        num_cells = self._height * self._width
+        if self._num_mines > num_cells:
+            raise ValueError("Cannot place " + str(self._num_mines) + " mines in " +
+                             str(num_cells) + " cells")
+
+        if self._use_arrays:
+            # the flat indices (row * width + col) of the mines, or on dense
+            # boards those of the cells left free, which is the smaller draw
+            state = np.random.RandomState(rng.randrange(2 ** 32))
+            if self._num_mines * 2 <= num_cells:
+                picks = sample_indices(state, num_cells, self._num_mines)
+            else:
+                keep = np.ones(num_cells, dtype=np.bool_)
+                keep[sample_indices(state, num_cells, num_cells - self._num_mines)] = False
+                picks = np.flatnonzero(keep)
+            picks.sort()
+            self._minefield.reshape(-1)[picks] = 9
+            rows, cols = np.divmod(picks, self._width)
+            self._mine_locs = list(zip(rows.tolist(), cols.tolist()))
+            return
+
+        # sample the flat indices of the mines, or on dense boards those of
+        # the cells left free, which is the smaller draw
+        if self._num_mines * 2 <= num_cells:
+            picks = rng.sample(range(num_cells), self._num_mines)
+        else:
+            free = set(rng.sample(range(num_cells), num_cells - self._num_mines))
+            picks = [pick for pick in range(num_cells) if pick not in free]
+        picks.sort()
+        self._mine_locs = [divmod(pick, self._width) for pick in picks]
+        for row, col in self._mine_locs:
+            self._minefield[row][col] = 9
+
+    def relocate_mines(self, cell_clicked):
+        """ Move the mines out of the safe zone around cell_clicked, each to a
+            random cell outside it that has no mine yet. The layout stays
+            uniformly random over the allowed cells, and only the hints
+            around the moved mines change. """
+        if self._safe_zone == SAFE_NEIGHBORHOOD:
+            zone = [cell_clicked] + self.get_neighbors(cell_clicked[0], cell_clicked[1])
+        else:
+            zone = [cell_clicked]
+        num_cells = self._height * self._width
+        if self._num_mines > num_cells - len(zone):
+            raise ValueError("Cannot place " + str(self._num_mines) + " mines in " +
+                             str(num_cells - len(zone)) + " allowed cells")
+        moving = [cell for cell in zone if self.get_cell(cell[0], cell[1]) == 9]
+        if not moving:
+            return
+        zone = set(zone)
+        free = num_cells - len(zone) - (self._num_mines - len(moving))
+        targets = []
+        if free * 8 >= num_cells:
+            # most cells are free; draw until an allowed one comes up
+            while len(targets) < len(moving):
+                row, col = divmod(self._rng.randrange(num_cells), self._width)
+                if (row, col) not in zone and (row, col) not in targets and \
+                   self.get_cell(row, col) != 9:
+                    targets.append((row, col))
+        else:
+            candidates = [(row, col) for row in range(self._height) for col in range(self._width)
+                          if (row, col) not in zone and self.get_cell(row, col) != 9]
+            targets = self._rng.sample(candidates, len(moving))
+        for cell in moving:
+            self._set_mine(cell, False)
+        for cell in targets:
+            self._set_mine(cell, True)
+
+    def _set_mine(self, cell, is_mine):
+        """ Add or remove one mine, keeping the hint numbers around it right """
+        row, col = cell
+        neighbors = self.get_neighbors(row, col)
+        change = 1 if is_mine else -1
+        for n_row, n_col in neighbors:
+            if self._minefield[n_row][n_col] != 9:
+                self._minefield[n_row][n_col] += change
+        if is_mine:
+            self._minefield[row][col] = 9
+            bisect.insort(self._mine_locs, cell)
+        else:
+            self._minefield[row][col] = sum(1 for n_row, n_col in neighbors
+                                            if self._minefield[n_row][n_col] == 9)
+            del self._mine_locs[bisect.bisect_left(self._mine_locs, cell)]
+
+    def show_cell(self, cell, number):
+        """ Reveal a cell whose number is known from elsewhere, e.g. a game
+            server, on a board whose mines are not laid out here """
+        self._minefield[cell[0]][cell[1]] = number
+        self.reveal(cell)
+
+    def reveal(self, cell):
+        """ Reveal a given cell """
+        if not self._revealed[cell[0]][cell[1]]:
+            self._revealed[cell[0]][cell[1]] = True
+            self._num_revealed += 1
+
+    def mass_reveal(self, cell):
+        """ Reveal given cell and flood outwards through all connected empty
+            cells with an iterative scanline fill (no recursion, so any board
+            size is safe). Return the list of newly revealed cells. """
+        already_revealed = self._revealed[cell[0]][cell[1]]
+        if self._minefield[cell[0]][cell[1]] != 0:
+            if already_revealed:
+                return []
+            self._revealed[cell[0]][cell[1]] = True
+            self._num_revealed += 1
+            return [cell]
+
+        self._revealed[cell[0]][cell[1]] = False  # so that the fill starts from it
+        changed = self._flood([cell])
+        if already_revealed:
+            changed.remove(cell)
+        self._num_revealed += len(changed)
+        return changed
+
+    def mass_reveal_cells(self, cells):
+        """ Reveal the given cells, flooding from the empty ones among them
+            in a single fill. Return the list of newly revealed cells. """
+        changed = []
+        stack = []
+        for row, col in cells:
+            if self._revealed[row][col]:
+                continue
+            if self._minefield[row][col] == 0:
+                stack.append((row, col))
+            else:
+                self._revealed[row][col] = True
+                changed.append((row, col))
+        changed.extend(self._flood(stack))
+        self._num_revealed += len(changed)
+        return changed
+
+    def _flood(self, stack):
+        """ Scanline fill from the covered empty cells on the stack; return
+            the cells it reveals, without counting them as revealed """
+        changed = []
+        while stack:
+            row, col = stack.pop()
+            hints = self._minefield[row]
+            revealed = self._revealed[row]
+            if revealed[col]:
+                continue
+            # widen the seed into the whole run of unrevealed empty cells on its row
+            left = col
+            while left > 0 and hints[left - 1] == 0 and not revealed[left - 1]:
+                left -= 1
+            right = col
+            while right < self._width - 1 and hints[right + 1] == 0 and not revealed[right + 1]:
+                right += 1
+            first = max(left - 1, 0)
+            last = min(right + 2, self._width)
+            for n_col in range(first, last):
+                if not revealed[n_col]:
+                    revealed[n_col] = True
+                    changed.append((row, n_col))
+            # the run touches columns first..last-1 of the rows above and below:
+            # reveal numbered cells there, queue one seed per run of empty ones
+            for n_row in (row - 1, row + 1):
+                if n_row < 0 or n_row >= self._height:
+                    continue
+                n_hints = self._minefield[n_row]
+                n_revealed = self._revealed[n_row]
+                in_run = False
+                for n_col in range(first, last):
+                    if n_revealed[n_col]:
+                        in_run = False
+                    elif n_hints[n_col] == 0:
+                        if not in_run:
+                            stack.append((n_row, n_col))
+                            in_run = True
+                    else:
+                        n_revealed[n_col] = True
+                        changed.append((n_row, n_col))
+                        in_run = False
+        return changed
+
+    def get_3bv(self):
+        """ Return the 3BV of the board: the least number of left clicks
+            that clears it, i.e. one per opening (connected empty cells and
+            their border) plus one per numbered cell outside any opening """
+        minefield = self.get_minefield()
+        covered = [[number != 9 for number in row] for row in minefield]
+        clicks = 0
+        for row in range(self._height):
+            for col in range(self._width):
+                if minefield[row][col] != 0 or not covered[row][col]:
+                    continue
+                clicks += 1
+                covered[row][col] = False
+                stack = [(row, col)]
+                while stack:
+                    cell = stack.pop()
+                    for n_row, n_col in self.get_neighbors(cell[0], cell[1]):
+                        if covered[n_row][n_col]:
+                            covered[n_row][n_col] = False
+                            if minefield[n_row][n_col] == 0:
+                                stack.append((n_row, n_col))
+        return clicks + sum(sum(row) for row in covered)
+
+    def get_packed_state(self):
+        """ Return the mines and the revealed cells as two bitmaps laid out
+            like those of pack_cells, for compact saving """
+        if self._use_arrays:
+            return (np.packbits(self._minefield == 9).tobytes(),
+                    np.packbits(self._revealed).tobytes())
+        rows = self.get_revealed()
+        revealed = [(row, col) for row in range(self._height) for col in range(self._width)
+                    if rows[row][col]]
+        return (pack_cells(self._mine_locs, self._height, self._width),
+                pack_cells(revealed, self._height, self._width))
+
+    def unpack_state(self, mines, revealed):
+        """ Restore the mines and the revealed cells from the bitmaps of
+            get_packed_state; the hint numbers are recomputed """
+        if self._use_arrays:
+            num_cells = self._height * self._width
+            for data in (mines, revealed):
+                if len(data) != (num_cells + 7) // 8:
+                    raise ValueError("A bitmap of " + str(len(data)) + " bytes does not fit " +
+                                     str(self._height) + "x" + str(self._width) + " cells")
+            shape = (self._height, self._width)
+            mask = np.unpackbits(np.frombuffer(mines, dtype=np.uint8))[:num_cells]
+            mask = mask.astype(np.bool_).reshape(shape)
+            self._minefield = np.zeros(shape, dtype=np.int8)
+            self._minefield[mask] = 9
+            rows, cols = np.nonzero(mask)
+            self._mine_locs = list(zip(rows.tolist(), cols.tolist()))
+            self._revealed = np.unpackbits(np.frombuffer(revealed, dtype=np.uint8))[:num_cells]
+            self._revealed = self._revealed.astype(np.bool_).reshape(shape)
+            self._num_revealed = int(np.count_nonzero(self._revealed))
+        else:
+            self._mine_locs = unpack_cells(mines, self._height, self._width)
+            self._minefield = [[0] * self._width for row in range(self._height)]
+            for row, col in self._mine_locs:
+                self._minefield[row][col] = 9
+            self._revealed = [[False] * self._width for row in range(self._height)]
+            cells = unpack_cells(revealed, self._height, self._width)
+            for row, col in cells:
+                self._revealed[row][col] = True
+            self._num_revealed = len(cells)
+        if len(self._mine_locs) != self._num_mines:
+            raise ValueError("The saved board has " + str(len(self._mine_locs)) +
+                             " mines instead of " + str(self._num_mines))
+        self.compute_hints()
+        self._placed = True
+
+    def retrieve_state(self, saved_data):
+        """ Set class fields according to saved_data.
+            Saved_data is a dictionary holding either the packed bitmaps of
+            get_packed_state or, from older saves, the full rows """
+        self._height = saved_data['height']
+        self._width = saved_data['width']
+        self._num_mines = saved_data['num_mines']
+        if 'mine_bitmap' in saved_data:
+            if saved_data.get('seed') is not None:
+                self._seed = saved_data['seed']
+            self.unpack_state(saved_data['mine_bitmap'], saved_data['revealed_bitmap'])
+            return
+        self._minefield = saved_data['minefield']
+        self._revealed = saved_data['revealed']
+        self._mine_locs = saved_data['mine_locs']        
+        self._placed = True
+        self._num_revealed = sum(sum(1 for revealed in row if revealed) for row in self._revealed)
+        if self._use_arrays:
+            self._minefield = np.array([list(row) for row in self._minefield], dtype=np.int8)
+            self._revealed = np.array([list(row) for row in self._revealed], dtype=np.bool_)
+
+class ChunkedMinefield(Minefield):
+    """ A minefield for huge boards. Mines and hint numbers are generated per
+        CHUNK_SIZE x CHUNK_SIZE tile the first time a tile is touched, so the
+        memory used follows the explored area instead of the board area. """
+    def __init__(self, height, width, num_mines, seed=None, safe_zone=SAFE_CELL, saved_field=None):
+        """ Optional - saved_field, as for Minefield, continues a saved game """
+        self._height = height
+        self._width = width
+        self._num_mines = num_mines
+        self._use_arrays = False
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        elif isinstance(seed, random.Random):
+            seed = seed.randrange(2 ** 32)  # chunks need a plain number to derive their seeds
+        self._seed = seed
+        self._safe_zone = safe_zone
+        self._safe_cells = frozenset()  # cells kept free of mines, set on the first click
+        self._chunk_mines = {}          # (chunk_row, chunk_col) -> frozenset of mine cells
+        self._chunks = {}               # (chunk_row, chunk_col) -> (hints, revealed) rows
+        self._num_revealed = 0
+        if saved_field:
+            self.retrieve_state(saved_field)
+        self._size = get_size_name(self._height, self._width, self._num_mines)
+
+    def get_num_chunks(self):
+        """ Return the number of tiles whose hint numbers have been generated """
+        return len(self._chunks)
+
+    def _chunk_bounds(self, key):
+        """ Return top, left, number of rows and of columns of a tile """
+        top = key[0] * CHUNK_SIZE
+        left = key[1] * CHUNK_SIZE
+        return (top, left, min(CHUNK_SIZE, self._height - top),
+                min(CHUNK_SIZE, self._width - left))
+
+    def _chunk_mine_count(self, key):
+        """ Share the mines out over the tiles in proportion to the cells of
+            each that may hold a mine, i.e. those outside the safe zone. Each
+            tile's share only depends on those cells before it in row-major
+            tile order, so the shares always add up to self._num_mines, and
+            none is larger than the cells its tile has room for. """
+        top, left, rows, cols = self._chunk_bounds(key)
+        start = top * self._width + rows * left
+        end = start + rows * cols
+        for row, col in self._safe_cells:
+            safe_key = (row // CHUNK_SIZE, col // CHUNK_SIZE)
+            if safe_key < key:
+                start -= 1
+                end -= 1
+            elif safe_key == key:
+                end -= 1
+        total = self._height * self._width - len(self._safe_cells)
+        if not self._num_mines:
+            return 0
+        return self._num_mines * end // total - self._num_mines * start // total
+
+    def _get_chunk_mines(self, key):
+        """ Return the mine cells of a tile. They depend only on the board seed
+            and the tile position, so neighboring tiles always agree. """
+        mines = self._chunk_mines.get(key)
+        if mines is None:
+            top, left, rows, cols = self._chunk_bounds(key)
+            rng = random.Random((self._seed * 1000003 + key[0]) * 1000003 + key[1])
+            cells = [(top + row, left + col) for row in range(rows) for col in range(cols)
+                     if (top + row, left + col) not in self._safe_cells]
+            mines = frozenset(rng.sample(cells, self._chunk_mine_count(key)))
+            self._chunk_mines[key] = mines
+        return mines
+
+    def _get_chunk(self, key):
+        """ Return the (hints, revealed) rows of a tile, generating them on first use """
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            top, left, rows, cols = self._chunk_bounds(key)
+            hints = [[0] * cols for row in range(rows)]
+            for chunk_row in range(max(key[0] - 1, 0), key[0] + 2):
+                for chunk_col in range(max(key[1] - 1, 0), key[1] + 2):
+                    if chunk_row * CHUNK_SIZE >= self._height or chunk_col * CHUNK_SIZE >= self._width:
+                        continue
+                    # every mine adds one to the cells around it that lie in this tile
+                    for mine_row, mine_col in self._get_chunk_mines((chunk_row, chunk_col)):
+                        for row in range(max(mine_row - 1, top), min(mine_row + 2, top + rows)):
+                            hint_row = hints[row - top]
+                            for col in range(max(mine_col - 1, left), min(mine_col + 2, left + cols)):
+                                hint_row[col - left] += 1
+            for mine_row, mine_col in self._get_chunk_mines(key):
+                hints[mine_row - top][mine_col - left] = 9
+            chunk = (hints, [[False] * cols for row in range(rows)])
+            self._chunks[key] = chunk
+        return chunk
+
+    @property
+    def _mine_locs(self):
+        """ Sorted list of all mines. This generates the mines of every tile,
+            so it is only meant for the end of a game. """
+        mines = []
+        for chunk_row in range((self._height + CHUNK_SIZE - 1) // CHUNK_SIZE):
+            for chunk_col in range((self._width + CHUNK_SIZE - 1) // CHUNK_SIZE):
+                mines.extend(self._get_chunk_mines((chunk_row, chunk_col)))
+        return sorted(mines)
+
+    def get_cell(self, row, col):
+        hints = self._get_chunk((row // CHUNK_SIZE, col // CHUNK_SIZE))[0]
+        return hints[row % CHUNK_SIZE][col % CHUNK_SIZE]
+
+    def is_revealed(self, row, col):
+        # a tile that was never generated has nothing revealed yet
+        chunk = self._chunks.get((row // CHUNK_SIZE, col // CHUNK_SIZE))
+        return chunk is not None and chunk[1][row % CHUNK_SIZE][col % CHUNK_SIZE]
+
+    def get_minefield(self):
+        """ Return the whole board as a list of lists; this generates every tile """
+        return [[self.get_cell(row, col) for col in range(self._width)]
+                for row in range(self._height)]
+
+    def get_revealed(self):
+        return [[self.is_revealed(row, col) for col in range(self._width)]
+                for row in range(self._height)]
+
+    def build_grid(self, cell_clicked):
+        """ Nothing is generated up front; only keep the safe zone around
+            cell_clicked free of mines """
+        safe_cells = [cell_clicked]
+        if self._safe_zone == SAFE_NEIGHBORHOOD:
+            safe_cells += self.get_neighbors(cell_clicked[0], cell_clicked[1])
+        num_cells = self._height * self._width
+        if self._num_mines > num_cells - len(safe_cells):
+            raise ValueError("Cannot place " + str(self._num_mines) + " mines in " +
+                             str(num_cells - len(safe_cells)) + " allowed cells")
+        self._safe_cells = frozenset(safe_cells)
+        self.seed_mines()
+
+    def seed_mines(self, rng=None):
+        """ Forget the mines generated so far. The tiles are seeded from the
+            board seed when they are first generated; rng, a seed or a
+            random.Random instance, replaces that seed. """
+        if rng is not None:
+            self._seed = rng if not isinstance(rng, random.Random) else rng.randrange(2 ** 32)
+        self._chunk_mines = {}
+        self._chunks = {}
+        self._num_revealed = 0
+
+    def reveal(self, cell):
+        revealed = self._get_chunk((cell[0] // CHUNK_SIZE, cell[1] // CHUNK_SIZE))[1]
+        if not revealed[cell[0] % CHUNK_SIZE][cell[1] % CHUNK_SIZE]:
+            revealed[cell[0] % CHUNK_SIZE][cell[1] % CHUNK_SIZE] = True
+            self._num_revealed += 1
+
+    def mass_reveal(self, cell):
+        """ Reveal given cell and flood outwards through all connected empty
+            cells, generating tiles as the fill reaches them. Return the list
+            of newly revealed cells. """
+        changed = []
+        if not self.is_revealed(cell[0], cell[1]):
+            self.reveal(cell)
+            changed.append(cell)
+        if self.get_cell(cell[0], cell[1]) != 0:
+            return changed
+        return self._flood([cell], changed)
+
+    def mass_reveal_cells(self, cells):
+        """ Reveal the given cells, flooding from the empty ones among them
+            in a single fill. Return the list of newly revealed cells. """
+        changed = []
+        stack = []
+        for cell in cells:
+            if self.is_revealed(cell[0], cell[1]):
+                continue
+            self.reveal(cell)
+            changed.append(cell)
+            if self.get_cell(cell[0], cell[1]) == 0:
+                stack.append(cell)
+        return self._flood(stack, changed)
+
+    def _flood(self, stack, changed):
+        """ Reveal the neighbors of the revealed empty cells on the stack and
+            on through the empty ones; append them to changed and return it """
+        while stack:
+            row, col = stack.pop()
+            for n_row in range(max(row - 1, 0), min(row + 2, self._height)):
+                for n_col in range(max(col - 1, 0), min(col + 2, self._width)):
+                    hints, revealed = self._get_chunk((n_row // CHUNK_SIZE, n_col // CHUNK_SIZE))
+                    revealed_row = revealed[n_row % CHUNK_SIZE]
+                    if revealed_row[n_col % CHUNK_SIZE]:
+                        continue
+                    revealed_row[n_col % CHUNK_SIZE] = True
+                    self._num_revealed += 1
+                    changed.append((n_row, n_col))
+                    if hints[n_row % CHUNK_SIZE][n_col % CHUNK_SIZE] == 0:
+                        stack.append((n_row, n_col))
+        return changed
+
+    def retrieve_state(self, saved_data):
+        """ Set class fields according to saved_data, a dictionary like that
+            of Minefield.retrieve_state. Every tile gets its saved mines, but
+            only the tiles with revealed cells get their hint numbers. """
+        self._height = saved_data['height']
+        self._width = saved_data['width']
+        self._num_mines = saved_data['num_mines']
+        if 'mine_bitmap' in saved_data:
+            if saved_data.get('seed') is not None:
+                self._seed = saved_data['seed']
+            mines = unpack_cells(saved_data['mine_bitmap'], self._height, self._width)
+            revealed = unpack_cells(saved_data['revealed_bitmap'], self._height, self._width)
+        else:
+            mines = [tuple(cell) for cell in saved_data['mine_locs']]
+            revealed = [(row, col) for row, cells in enumerate(saved_data['revealed'])
+                        for col, is_revealed in enumerate(cells) if is_revealed]
+        if len(mines) != self._num_mines:
+            raise ValueError("The saved board has " + str(len(mines)) +
+                             " mines instead of " + str(self._num_mines))
+        chunk_mines = {}
+        for row, col in mines:
+            chunk_mines.setdefault((row // CHUNK_SIZE, col // CHUNK_SIZE), []).append((row, col))
+        self._chunk_mines = {}
+        for chunk_row in range((self._height + CHUNK_SIZE - 1) // CHUNK_SIZE):
+            for chunk_col in range((self._width + CHUNK_SIZE - 1) // CHUNK_SIZE):
+                key = (chunk_row, chunk_col)
+                self._chunk_mines[key] = frozenset(chunk_mines.get(key, ()))
+        self._chunks = {}
+        self._num_revealed = 0
+        for cell in revealed:
+            self.reveal(cell)
+
+class Game_parameters():
+    """ Class manipulating the rest of game parameters """
+    def __init__(self, remaining_mines, saved_data=None):
+        if saved_data:
+            # Pass saved data, if any
+            self.retrieve_info(saved_data)
+        else:           
+            self._marked_fields = set()  # holds mines marked by player
+            self._questions = set()      # holds fields marked as questionable by player
+            self._timer = 0          # measures game time
+            self._remaining_mines = remaining_mines  # holds number of remaining mines for
+            self._first_click = True    # keep track of the first mouseclick to start timer and other stuff
+            self._flagged_neighbors = {}
+        self._in_progress = True    # keep track of whether the game is still in progress for saving purposes
+        # marks that do and do not sit on a mine, so that a win is seen in O(1)
+        self._correct_flags = 0
+        self._wrong_flags = 0
+       
+    def get_time(self):
+        return self._timer
+
+    def get_remaining_mines(self):
+        return self._remaining_mines   
+
+    def is_first_click(self):
+        return self._first_click
+
+    def is_in_progress(self):
+        return self._in_progress
+
+    def is_marked(self, cell):
+        return cell in self._marked_fields
+
+    def is_question(self, cell):
+        return cell in self._questions
+
+    def get_num_flags(self):
+        return len(self._marked_fields)
+
+    def get_num_questions(self):
+        return len(self._questions)
+
+    def get_marked_fields(self):
+        """ Return the cells marked as mines in order, e.g. for saving """
+        return sorted(self._marked_fields)
+
+    def get_questions(self):
+        """ Return the cells marked as questionable in order """
+        return sorted(self._questions)
+
+    def get_flagged_neighbors(self, cell):
+        """ Return the number of neighbors of a cell marked as mines """
+        return self._flagged_neighbors.get(cell, 0)
+
+    def mark_mine(self, cell, is_mine, neighbors=()):
+        """ Mark a cell as a mine; is_mine tells whether there is one.
+            The flagged-neighbor counts of the given neighbors go up. """
+        self._marked_fields.add(cell)
+        for neighbor in neighbors:
+            self._flagged_neighbors[neighbor] = self._flagged_neighbors.get(neighbor, 0) + 1
+        if is_mine:
+            self._correct_flags += 1
+        else:
+            self._wrong_flags += 1
+        self._remaining_mines -= 1
+
+    def unmark_mine(self, mine, is_mine, neighbors=()):
+        """ Turn the mine mark of a cell into a question mark """
+        self._marked_fields.remove(mine)
+        for neighbor in neighbors:
+            count = self._flagged_neighbors[neighbor] - 1
+            if count:
+                self._flagged_neighbors[neighbor] = count
+            else:
+                del self._flagged_neighbors[neighbor]   # kept small on huge boards
+        if is_mine:
+            self._correct_flags -= 1
+        else:
+            self._wrong_flags -= 1
+        self._questions.add(mine)
+        self._remaining_mines += 1        
+
+    def unmark_question(self, field):
+        """ Remove the question mark of a cell """
+        self._questions.discard(field)
+
+    def count_flags(self, minefield):
+        """ Recount the marks sitting on mines, once the mines are laid out,
+            and the marks around every cell, e.g. after loading a game """
+        self._correct_flags = sum(1 for row, col in self._marked_fields
+                                  if minefield.get_cell(row, col) == 9)
+        self._wrong_flags = len(self._marked_fields) - self._correct_flags
+        self._flagged_neighbors = {}
+        for row, col in self._marked_fields:
+            for neighbor in minefield.get_neighbors(row, col):
+                self._flagged_neighbors[neighbor] = self._flagged_neighbors.get(neighbor, 0) + 1
+
+    def all_mines_marked(self, num_mines):
+        """ Return True if exactly the num_mines mines are marked """
+        return self._wrong_flags == 0 and self._correct_flags == num_mines
+
+    def close_game(self):
+        self._in_progress = False
+
+    def check_first_click(self):
+        self._first_click = False
+                 
+    def retrieve_info(self, data):
+        """ Get fields from saved data """        
+        self._timer = data['timer']
+        self._remaining_mines = data['remaining']
+        self._marked_fields = set(data['marked'])
+        self._questions = set(data['questions'])
+        self._first_click = False
+        self._flagged_neighbors = {}    # see count_flags
+
+def get_size_name(height, width, num_mines):
+    """ Return the name a board size is recorded under in the results table """
+    for name, dimensions in NEW_GAME_REFERENCE.items():
+        if dimensions == [height, width, num_mines]:
+            return name
+    return str(height) + "x" + str(width) + "/" + str(num_mines)
+
+class GameEngine():
+    """ Plays a game of Minesweeper without any user interface.
+        Cells are (row, col) tuples; every move returns the list of cells
+        whose appearance changed, so a front end only has to redraw those.
+        Listeners added with add_listener are called with those lists too,
+        and those added with add_move_listener with the moves themselves. """
+    def __init__(self, minefield_class=Minefield, chunked_class=ChunkedMinefield,
+                 params_class=Game_parameters):
+        self._minefield_class = minefield_class    # front ends pass subclasses
+        self._chunked_class = chunked_class        # that know how to draw
+        self._params_class = params_class
+        self._minefield = None
+        self._params = None
+        self._state = READY
+        self._moves = 0
+        self._listeners = []
+        self._move_listeners = []
+        self._seed_finder = None
+        self._no_guess = False
+        self._prefetched = {}   # (height, width, num_mines, safe_zone) -> (thread, [minefield])
+
+    def set_seed_finder(self, finder):
+        """ Use finder(height, width, num_mines, cell, safe_zone) to pick the
+            seed of no-guess games on their first reveal; it returns a seed,
+            or None to keep the game's own. See generator.py. """
+        self._seed_finder = finder
+
+    def add_listener(self, listener):
+        """ Call listener(changed_cells) after every move that changed something,
+            and listener(None) whenever a new game is started or loaded """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def add_move_listener(self, listener):
+        """ Call listener(move, cell) after every move that changed something,
+            move being the name of the method played, e.g. 'reveal'. Playing
+            the same moves again on the same board repeats the game. """
+        self._move_listeners.append(listener)
+
+    def remove_move_listener(self, listener):
+        self._move_listeners.remove(listener)
+
+    def new_game(self, height, width, num_mines, seed=None, safe_zone=SAFE_CELL, chunked=False,
+                 no_guess=False):
+        """ Start a new game; the mines are placed on the first reveal.
+            With no_guess, the seed finder picks a board that can be cleared
+            without guessing; such games open with a SAFE_NEIGHBORHOOD. """
+        if no_guess:
+            if self._seed_finder is None or chunked:
+                raise ValueError("No-guess games need a seed finder and a regular minefield")
+            safe_zone = SAFE_NEIGHBORHOOD
+        self._no_guess = no_guess
+        prefetched = self._prefetched.pop((height, width, num_mines, safe_zone), None)
+        self._prefetched = {}
+        if prefetched is not None and seed is None and not chunked and not no_guess:
+            prefetched[0].join()    # normally long finished
+        else:
+            prefetched = None
+        if chunked:
+            self._minefield = self._chunked_class(height, width, num_mines, seed=seed,
+                                                  safe_zone=safe_zone)
+        elif prefetched is not None and prefetched[1]:
+            self._minefield = prefetched[1][0]
+        else:
+            self._minefield = self._minefield_class(height, width, num_mines, seed=seed,
+                                                    safe_zone=safe_zone)
+        self._params = self._params_class(num_mines)
+        self._state = READY
+        self._moves = 0
+        self._notify_new_game()
+        return self._minefield
+
+    def prefetch(self, height, width, num_mines, safe_zone=SAFE_CELL):
+        """ Lay out the mines of a board of this size in a background thread,
+            e.g. while a menu is showing. If the next new_game asks for this
+            size, it gets that board, and its first reveal only has to move
+            the mines out of the safe zone. """
+        key = (height, width, num_mines, safe_zone)
+        if key in self._prefetched:
+            return
+        result = []
+
+        def build():
+            minefield = self._minefield_class(height, width, num_mines, safe_zone=safe_zone)
+            minefield.place_mines()
+            result.append(minefield)
+
+        worker = threading.Thread(target=build)
+        worker.daemon = True
+        worker.start()
+        self._prefetched[key] = (worker, result)
+
+    def load_game(self, minefield, params):
+        """ Continue a game from existing (e.g. saved) minefield and parameters """
+        self._minefield = minefield
+        self._params = params
+        self._no_guess = False
+        self._state = READY if params.is_first_click() else PLAYING
+        if self._state == PLAYING:
+            params.count_flags(minefield)
+        self._moves = 0
+        self._notify_new_game()
+
+    def get_minefield(self):
+        return self._minefield
+
+    def get_params(self):
+        return self._params
+
+    def get_state(self):
+        return self._state
+
+    def is_over(self):
+        return self._state == WON or self._state == LOST
+
+    def is_flagged(self, cell):
+        return self._params.is_marked(cell)
+
+    def reveal(self, cell):
+        """ Reveal a cell, flooding through empty cells. The first reveal
+            lays the mines out. Revealing a mine loses the game. Like the
+            other moves, it does nothing with a cell off the board. """
+        if self.is_over() or not self._on_board(cell) or self.is_flagged(cell):
+            return []
+        self._moves += 1
+        if self._state == READY:
+            if self._no_guess:
+                seed = self._seed_finder(self._minefield.get_height(), self._minefield.get_width(),
+                                         self._minefield.get_num_mines(), cell, SAFE_NEIGHBORHOOD)
+                if seed is not None:
+                    self._minefield.set_seed(seed)
+            self._minefield.build_grid(cell)
+            self._params.count_flags(self._minefield)   # marks placed before the mines
+            self._params.check_first_click()
+            self._state = PLAYING
+        if self._minefield.get_cell(cell[0], cell[1]) == 9:
+            self._minefield.reveal(cell)
+            self._lose()
+            return self._notify([cell], 'reveal', cell)
+        changed = self._minefield.mass_reveal(cell)
+        if self._all_safe_revealed():
+            self._win()
+        return self._notify(changed, 'reveal', cell)
+
+    def toggle_flag(self, cell):
+        """ Cycle the mark of a covered cell: none -> mine -> question -> none """
+        return self._notify(self._cycle_mark(cell), 'toggle_flag', cell)
+
+    def _cycle_mark(self, cell):
+        """ toggle_flag without notifying; return the changed cells """
+        if self.is_over() or not self._on_board(cell):
+            return []
+        self._moves += 1
+        if self._params.is_marked(cell):
+            self._params.unmark_mine(cell, self._is_mine(cell), self._minefield.get_neighbors(*cell))
+        elif self._params.is_question(cell):
+            self._params.unmark_question(cell)
+        elif not self._minefield.is_revealed(cell[0], cell[1]):
+            self._params.mark_mine(cell, self._is_mine(cell), self._minefield.get_neighbors(*cell))
+        else:
+            return []
+        # taking a wrong mark off can complete the game as well
+        if self._state == PLAYING and self._params.all_mines_marked(self._minefield.get_num_mines()):
+            self._win()
+        return [cell]
+
+    def flag(self, cell):
+        """ Mark a covered cell as a mine, whatever its mark was """
+        if self.is_over() or not self._on_board(cell) or self.is_flagged(cell) or \
+           self._minefield.is_revealed(cell[0], cell[1]):
+            return []
+        if self._params.is_question(cell):
+            self._params.unmark_question(cell)
+        return self._notify(self._cycle_mark(cell), 'flag', cell)
+
+    def clear_mark(self, cell):
+        """ Remove any mark from a cell """
+        if self.is_over() or not self._on_board(cell):
+            return []
+        changed = []
+        if self.is_flagged(cell):
+            self._params.unmark_mine(cell, self._is_mine(cell), self._minefield.get_neighbors(*cell))
+            changed = [cell]
+        if self._params.is_question(cell):
+            self._params.unmark_question(cell)
+            changed = [cell]
+        if not changed:
+            return []
+        self._moves += 1
+        # taking a wrong mark off can complete the game, as in _cycle_mark
+        if self._state == PLAYING and self._params.all_mines_marked(self._minefield.get_num_mines()):
+            self._win()
+        return self._notify(changed, 'clear_mark', cell)
+
+    def chord(self, cell):
+        """ On a revealed number with as many marked mines around it,
+            reveal all of its other covered neighbors in one flood fill.
+            A wrong mark makes the first unmarked mine go off. """
+        if self._state != PLAYING or not self._on_board(cell) or \
+           not self._minefield.is_revealed(cell[0], cell[1]):
+            return []
+        number = self._minefield.get_cell(cell[0], cell[1])
+        if number == 0 or number != self._params.get_flagged_neighbors(cell):
+            return []
+        self._moves += 1
+        covered = []
+        mine = None
+        for neighbor in self._minefield.get_neighbors(cell[0], cell[1]):
+            if self._params.is_marked(neighbor) or self._minefield.is_revealed(neighbor[0], neighbor[1]):
+                continue
+            if self._minefield.get_cell(neighbor[0], neighbor[1]) == 9:
+                mine = neighbor
+                break
+            covered.append(neighbor)
+        changed = self._minefield.mass_reveal_cells(covered)
+        if mine is not None:
+            self._minefield.reveal(mine)
+            changed.append(mine)
+            self._lose()
+        elif self._all_safe_revealed():
+            self._win()
+        return self._notify(changed, 'chord', cell)
+
+    def tick(self, seconds=1):
+        """ Advance the game clock while a game is being played """
+        if self._state == PLAYING:
+            self._params._timer += seconds
+
+    def status(self):
+        """ Return a snapshot of the game as a dictionary. Everything in it
+            is kept up to date move by move, so it is cheap to poll. """
+        minefield = self._minefield
+        safe_cells = minefield.get_height() * minefield.get_width() - minefield.get_num_mines()
+        return {'state': self._state,
+                'height': self._minefield.get_height(),
+                'width': self._minefield.get_width(),
+                'mines': self._minefield.get_num_mines(),
+                'seed': self._minefield.get_seed(),
+                'moves': self._moves,
+                'time': self._params.get_time(),
+                'flags': self._params.get_num_flags(),
+                'questions': self._params.get_num_questions(),
+                'remaining_mines': self._params.get_remaining_mines(),
+                'revealed': minefield.get_num_revealed(),
+                'safe_left': safe_cells - minefield.get_num_revealed()}
+
+    def _all_safe_revealed(self):
+        minefield = self._minefield
+        return minefield.get_num_revealed() == \
+               minefield.get_height() * minefield.get_width() - minefield.get_num_mines()
+
+    def _on_board(self, cell):
+        """ Return True if cell lies on the board; the moves ignore any other
+            cell rather than let a negative index wrap round """
+        return 0 <= cell[0] < self._minefield.get_height() and \
+               0 <= cell[1] < self._minefield.get_width()
+
+    def _is_mine(self, cell):
+        """ Return True if cell holds a mine; before the first reveal none does yet """
+        return self._state != READY and self._minefield.get_cell(cell[0], cell[1]) == 9
+
+    def _notify(self, changed, move, cell):
+        """ Pass the cells changed by a move, and the move, to the listeners;
+            return the cells """
+        if changed:
+            for listener in self._listeners:
+                listener(changed)
+            for listener in self._move_listeners:
+                listener(move, cell)
+        return changed
+
+    def _notify_new_game(self):
+        for listener in self._listeners:
+            listener(None)
+
+    def _win(self):
+        self._state = WON
+        self._params.close_game()
+
+    def _lose(self):
+        self._state = LOST
+        self._params.close_game()
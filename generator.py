@@ -0,0 +1,194 @@
+"""
+No-guess Minesweeper boards.
+
+A board is accepted only if the solver (solver.py) clears it from the first
+click without ever guessing. Most random boards need a guess, all the more
+so on the larger sizes, so candidate seeds are tried speculatively across a
+process pool and the first one that passes wins. To see how long players
+wait for a board:
+
+    python generator.py large --boards 100
+"""
+
+import argparse, multiprocessing, random, time, traceback
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+import engine, solver
+
+BATCH_SIZE = 4          # seeds a worker tries per task
+MAX_ATTEMPTS = 20000    # seeds tried before settling for a board that may need a guess
+
+CURRENT_BOARD = None    # in the workers: shared number of the board find_seed is after
+
+def is_no_guess(height, width, num_mines, seed, cell, safe_zone=engine.SAFE_NEIGHBORHOOD):
+    """ Return True if the solver clears the board without guessing """
+    game = engine.GameEngine()
+    game.new_game(height, width, num_mines, seed=seed, safe_zone=safe_zone)
+    bot = solver.Solver(game)
+    game.reveal(cell)
+    while not game.is_over():
+        action, target, is_guess = bot.next_move()
+        if is_guess:
+            return False
+        if action == solver.FLAG:
+            game.flag(target)
+        else:
+            game.reveal(target)
+    return game.get_state() == engine.WON
+
+def init_worker(current_board):
+    """ Pool initializer: share the number of the board being looked for """
+    global CURRENT_BOARD
+    CURRENT_BOARD = current_board
+
+def try_seeds(task):
+    """ Worker entry point: return the first seed of a batch that gives a
+        no-guess board (or None) and the number of seeds tried. A batch of
+        a board that is no longer looked for stops at its next seed. """
+    height, width, num_mines, seeds, cell, safe_zone, board = task
+    for tried, seed in enumerate(seeds):
+        if CURRENT_BOARD is not None and CURRENT_BOARD.value != board:
+            return None, tried
+        if is_no_guess(height, width, num_mines, seed, cell, safe_zone):
+            return seed, tried + 1
+    return None, len(seeds)
+
+def try_seeds_reporting(task):
+    """ Pool entry point: try_seeds, also returning the traceback of any
+        exception it raised, so that find_seed hears back from every batch """
+    try:
+        seed, tried = try_seeds(task)
+    except Exception:
+        return None, 0, traceback.format_exc()
+    return seed, tried, None
+
+class Generator():
+    """ Finds seeds of no-guess boards. Its find_seed method can be passed
+        to GameEngine.set_seed_finder. """
+    def __init__(self, processes=None, batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS):
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        self._processes = processes
+        self._batch_size = batch_size
+        self._max_attempts = max_attempts
+        self._rng = random.Random()
+        self._pool = None
+        self._board = 0         # number of the board find_seed is after
+        self._current_board = None  # the same, shared with the workers
+        self._attempts = 0      # seeds tried for the last board
+
+    def start(self):
+        """ Start the worker processes ahead of the first board """
+        if self._pool is None and self._processes > 1:
+            self._current_board = multiprocessing.RawValue('i', 0)
+            self._pool = multiprocessing.Pool(self._processes, init_worker, (self._current_board,))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def get_attempts(self):
+        """ Return the number of seeds tried for the last board """
+        return self._attempts
+
+    def _task(self, height, width, num_mines, cell, safe_zone):
+        seeds = [self._rng.randrange(2 ** 32) for seed in range(self._batch_size)]
+        return (height, width, num_mines, seeds, cell, safe_zone, self._board)
+
+    def find_seed(self, height, width, num_mines, cell, safe_zone=engine.SAFE_NEIGHBORHOOD):
+        """ Return the seed of a no-guess board opened at cell, or None if
+            none turned up within max_attempts seeds. An exception in a
+            worker process is raised here as a RuntimeError. """
+        self._attempts = 0
+        if self._processes == 1:
+            while self._attempts < self._max_attempts:
+                seed, tried = try_seeds(self._task(height, width, num_mines, cell, safe_zone))
+                self._attempts += tried
+                if seed is not None:
+                    return seed
+            return None
+
+        self.start()
+        self._board += 1
+        self._current_board.value = self._board
+        results = queue.Queue()
+        pending = 0
+        try:
+            # keep every worker busy
+            for task in range(self._processes * 2):
+                self._pool.apply_async(try_seeds_reporting,
+                                       (self._task(height, width, num_mines, cell, safe_zone),),
+                                       callback=results.put)
+                pending += 1
+            while pending:
+                seed, tried, error = results.get()
+                pending -= 1
+                if error is not None:
+                    raise RuntimeError("A worker failed to try seeds:\n" + error)
+                self._attempts += tried
+                if seed is not None:
+                    return seed
+                if self._attempts + pending * self._batch_size < self._max_attempts:
+                    self._pool.apply_async(try_seeds_reporting,
+                                           (self._task(height, width, num_mines, cell, safe_zone),),
+                                           callback=results.put)
+                    pending += 1
+            return None
+        finally:
+            # stop the batches still out at their next seed and wait for
+            # them, so that the next board has the workers to itself
+            self._current_board.value = 0
+            while pending:
+                results.get()
+                pending -= 1
+
+# ------------------------ Latency report -------------------------------------- #
+def percentile(values, fraction):
+    """ Return the value below which the given fraction of values lie """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def measure(generator, height, width, num_mines, boards):
+    """ Generate boards opened in the middle; return the seconds and the
+        seeds tried for each board """
+    cell = (height // 2, width // 2)
+    seconds = []
+    attempts = []
+    for board in range(boards):
+        start = time.time()
+        generator.find_seed(height, width, num_mines, cell)
+        seconds.append(time.time() - start)
+        attempts.append(generator.get_attempts())
+    return seconds, attempts
+
+def main():
+    import simulate
+    parser = argparse.ArgumentParser(description="Measure how long no-guess boards take to generate")
+    parser.add_argument('sizes', nargs='*', default=['small', 'medium', 'large'],
+                        help="small, medium, large, HxW/MINES or HxW@DENSITY")
+    parser.add_argument('--boards', type=int, default=50, help="boards per size")
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    generator = Generator(args.processes)
+    generator.start()
+    print("%-16s %8s %8s %8s %8s %8s %11s" % ('size', 'boards', 'p50 ms', 'p90 ms',
+                                             'p99 ms', 'max ms', 'seeds/board'))
+    try:
+        for size in args.sizes:
+            height, width, num_mines = simulate.parse_config(size)
+            seconds, attempts = measure(generator, height, width, num_mines, args.boards)
+            print("%-16s %8d %8.1f %8.1f %8.1f %8.1f %11.1f" % (
+                engine.get_size_name(height, width, num_mines), len(seconds),
+                1000 * percentile(seconds, 0.5), 1000 * percentile(seconds, 0.9),
+                1000 * percentile(seconds, 0.99), 1000 * max(seconds),
+                sum(attempts) / float(len(attempts))))
+    finally:
+        generator.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+The history of finished Minesweeper games, kept in the game's SQLite database.
+
+Every finished game is one row of the history table. The statistics of a
+board size (win rate, percentiles of the winning times, streaks) are single
+SQL queries answered from the indexes alone, never from the table, so they
+stay fast with hundreds of thousands of games. To fill a database with
+made-up games, e.g. to time the queries:
+
+    python history.py test.db --games 300000
+"""
+
+import argparse, random, sqlite3, time
+
+SCHEMA = ("CREATE TABLE IF NOT EXISTS results(id TEXT, best_time INT)",
+          "CREATE TABLE IF NOT EXISTS history(id INTEGER PRIMARY KEY, size TEXT, seed INT, "
+          "won INT, time INT, clicks INT, bbbv INT, played_at INT, streak INT)",
+          # winning times in order, for the best time and the percentiles
+          "CREATE INDEX IF NOT EXISTS history_times ON history(size, won, time)",
+          # the last game of a size, for the current streak
+          "CREATE INDEX IF NOT EXISTS history_recent ON history(size, id)",
+          "CREATE INDEX IF NOT EXISTS history_streaks ON history(size, streak)")
+# The statements are kept as constants: sqlite3 caches the prepared
+# statement of every SQL text it runs, so they are only compiled once
+INSERT_GAME = "INSERT INTO history(size, seed, won, time, clicks, bbbv, played_at, streak) " \
+              "VALUES(?, ?, ?, ?, ?, ?, ?, ?)"
+SELECT_LAST_STREAK = "SELECT streak FROM history WHERE size=? ORDER BY id DESC LIMIT 1"
+SELECT_TOTALS = "SELECT COUNT(*), TOTAL(won) FROM history WHERE size=?"
+SELECT_TIME = "SELECT time FROM history WHERE size=? AND won=1 ORDER BY time LIMIT 1 OFFSET ?"
+SELECT_LONGEST_STREAK = "SELECT MAX(streak) FROM history WHERE size=?"
+PERCENTILES = (0.5, 0.9)
+
+def connect(path):
+    """ Open the game database in write-ahead-log mode, creating the tables
+        as needed. The connection is meant to be kept for the whole session. """
+    connection = sqlite3.connect(path)
+    cursor = connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")    # safe with WAL, and fewer fsyncs
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    connection.commit()
+    return connection
+
+class History():
+    """ Records finished games and answers statistics about them """
+    def __init__(self, connection):
+        self._connection = connection
+
+    def record(self, size, seed, won, seconds, clicks, bbbv, played_at=None, commit=True):
+        """ Add a finished game. The streak stored with it is the number of
+            games won in a row on this size, this one included. """
+        if played_at is None:
+            played_at = int(time.time())
+        cursor = self._connection.cursor()
+        streak = 0
+        if won:
+            cursor.execute(SELECT_LAST_STREAK, (size,))
+            last = cursor.fetchone()
+            streak = (last[0] if last else 0) + 1
+        cursor.execute(INSERT_GAME, (size, seed, int(bool(won)), seconds, clicks, bbbv,
+                                     played_at, streak))
+        if commit:
+            self._connection.commit()
+
+    def get_stats(self, size):
+        """ Return a dictionary of statistics of a size: 'games', 'wins',
+            'win_rate', 'best' and 'percentiles' ({fraction: time}) of the
+            winning times, 'streak' (current) and 'longest_streak' """
+        cursor = self._connection.cursor()
+        cursor.execute(SELECT_TOTALS, (size,))
+        games, wins = cursor.fetchone()
+        wins = int(wins)
+        stats = {'games': games, 'wins': wins,
+                 'win_rate': wins / float(games) if games else 0.0,
+                 'best': None, 'percentiles': {}, 'streak': 0, 'longest_streak': 0}
+        if not games:
+            return stats
+        if wins:
+            stats['best'] = self._get_time(cursor, size, 0)
+            for fraction in PERCENTILES:
+                stats['percentiles'][fraction] = self._get_time(cursor, size,
+                                                                min(wins - 1, int(fraction * wins)))
+        cursor.execute(SELECT_LAST_STREAK, (size,))
+        stats['streak'] = cursor.fetchone()[0]
+        cursor.execute(SELECT_LONGEST_STREAK, (size,))
+        stats['longest_streak'] = cursor.fetchone()[0]
+        return stats
+
+    def _get_time(self, cursor, size, rank):
+        """ Return the rank-th fastest winning time of a size """
+        cursor.execute(SELECT_TIME, (size, rank))
+        return cursor.fetchone()[0]
+
+def fill(history, games, seed=0):
+    """ Record made-up games of the three classic sizes """
+    rng = random.Random(seed)
+    start = int(time.time()) - games
+    for game in range(games):
+        size, win_rate, mean_time = rng.choice((('small', 0.8, 20), ('medium', 0.6, 90),
+                                                ('large', 0.3, 250)))
+        history.record(size, rng.randrange(2 ** 32), rng.random() < win_rate,
+                       int(rng.expovariate(1.0 / mean_time)), rng.randrange(10, 300),
+                       rng.randrange(5, 200), start + game, commit=False)
+    history._connection.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill a game database with made-up games and time the statistics")
+    parser.add_argument('path', help="database file")
+    parser.add_argument('--games', type=int, default=100000)
+    args = parser.parse_args()
+
+    history = History(connect(args.path))
+    start = time.time()
+    fill(history, args.games)
+    print("%d games recorded in %.2f s" % (args.games, time.time() - start))
+    for size in ('small', 'medium', 'large'):
+        start = time.time()
+        stats = history.get_stats(size)
+        print("%-8s %s in %.2f ms" % (size, stats, 1000 * (time.time() - start)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Load generator for server.py: many players, each playing its own session
+game after game at a steady pace, and spectators watching them. Reports
+the moves served per second, the latency of the answers, how busy the
+server's single core was and how its memory grew per session:
+
+    python loadgen.py /tmp/mines.sock --spawn --sessions 2000 --seconds 30
+
+With --spawn it starts the server itself at the given address; otherwise
+the server must be listening there already. The clients are spread over
+a pool of processes, so that they do not become the bottleneck. Needs
+Python 3.7 or newer.
+"""
+
+import argparse, asyncio, json, multiprocessing, random, subprocess, sys, time
+import engine, profiler, server, simulate
+
+FLAG_SHARE = 0.1    # share of the moves that are right-clicks
+HOLD = 1.0          # seconds the connections stay open after the run, for the final statistics
+
+class Results():
+    def __init__(self):
+        self.latencies = []     # seconds from a move to its answer
+        self.games = 0
+        self.errors = 0
+        self.deltas = 0         # messages received by the spectators
+
+    def add(self, other):
+        self.latencies.extend(other.latencies)
+        self.games += other.games
+        self.errors += other.errors
+        self.deltas += other.deltas
+
+async def request(reader, writer, message):
+    writer.write(server.encode(message))
+    return json.loads((await reader.readline()).decode('utf-8'))
+
+async def play(address, size, pace, deadline, rng, results, session_ids):
+    """ Play games in one session until the deadline, making about pace
+        moves a second on random covered cells """
+    reader, writer = await server.open_connection(address)
+    height, width, num_mines = size
+    try:
+        while time.time() < deadline:
+            board = await request(reader, writer, {'op': 'new', 'height': height, 'width': width,
+                                                   'mines': num_mines})
+            session_ids.add(board['session'])     # the same session game after game
+            results.games += 1
+            covered = set((row, col) for row in range(height) for col in range(width))
+            state = board['state']
+            while state not in (engine.WON, engine.LOST) and time.time() < deadline:
+                await asyncio.sleep(rng.expovariate(pace))
+                move = 'toggle_flag' if rng.random() < FLAG_SHARE else 'reveal'
+                start = time.time()
+                delta = await request(reader, writer, {'op': move, 'cell': rng.choice(list(covered))})
+                results.latencies.append(time.time() - start)
+                if delta['op'] != 'delta':
+                    results.errors += 1
+                    continue
+                for row, col, value in delta['cells']:
+                    if isinstance(value, int):
+                        covered.discard((row, col))
+                state = delta['state']
+        await asyncio.sleep(max(0, deadline + HOLD - time.time()))
+    finally:
+        writer.close()
+
+async def watch(address, session_id, deadline, results):
+    """ Spectate a session until the deadline, counting its messages """
+    reader, writer = await server.open_connection(address)
+    try:
+        writer.write(server.encode({'op': 'watch', 'session': session_id}))
+        while True:
+            line = await asyncio.wait_for(reader.readline(), max(0.1, deadline + HOLD - time.time()))
+            if not line or json.loads(line.decode('utf-8'))['op'] == 'closed':
+                break
+            results.deltas += 1
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        writer.close()
+
+async def get_stats(address):
+    reader, writer = await server.open_connection(address)
+    try:
+        return await request(reader, writer, {'op': 'stats'})
+    finally:
+        writer.close()
+
+async def load(address, sessions, spectators, size, pace, ramp_end, deadline, seed):
+    """ Start the players, spread until ramp_end, then the spectators of
+        their sessions; play until the deadline and return the Results """
+    rng = random.Random(seed)
+    results = Results()
+    session_ids = set()
+    players = []
+    for player in range(sessions):
+        # spread the connections over the ramp-up
+        await asyncio.sleep(max(0, ramp_end - time.time()) / (sessions - player))
+        players.append(asyncio.ensure_future(play(address, size, pace, deadline,
+                                                  random.Random(rng.random()), results, session_ids)))
+    watchers = []
+    if spectators:
+        while len(session_ids) < sessions and time.time() < deadline:
+            await asyncio.sleep(0.01)
+        for session_id in sorted(session_ids):
+            for spectator in range(spectators):
+                watchers.append(asyncio.ensure_future(watch(address, session_id, deadline, results)))
+    failed = [task for task in await asyncio.gather(*(players + watchers), return_exceptions=True)
+              if isinstance(task, Exception)]
+    results.errors += len(failed)
+    return results
+
+def load_worker(task):
+    """ Worker entry point: run a share of the load """
+    server.raise_file_limit()
+    return asyncio.run(load(*task))
+
+def run(address, sessions, spectators, size, pace, seconds, ramp, processes, seed=0):
+    """ Run the load across a process pool; return the Results and the
+        server's statistics before and after """
+    before = asyncio.run(get_stats(address))
+    start = time.time()
+    deadline = start + ramp + seconds
+    shares = [sessions // processes + (index < sessions % processes) for index in range(processes)]
+    tasks = [(address, share, spectators, size, pace, start + ramp, deadline, seed * 1000003 + index)
+             for index, share in enumerate(shares) if share]
+    pool = multiprocessing.Pool(len(tasks))
+    try:
+        pending = pool.map_async(load_worker, tasks)
+        time.sleep(max(0, deadline - time.time()))
+        after = asyncio.run(get_stats(address))     # the connections are held open till now
+        after['wall'] = time.time() - start
+        results = Results()
+        for share in pending.get():
+            results.add(share)
+    finally:
+        pool.close()
+        pool.join()
+    return results, before, after
+
+def report(results, before, after, sessions, seconds):
+    latencies = sorted(results.latencies)
+    print("%d sessions, %d games, %d moves (%.0f a second), %d errors" % (
+        sessions, results.games, len(latencies), len(latencies) / seconds, results.errors))
+    if latencies:
+        print("latency %.2f ms median, %.2f ms p99, %.2f ms max" % (
+            1000 * profiler.percentile(latencies, 0.5), 1000 * profiler.percentile(latencies, 0.99),
+            1000 * latencies[-1]))
+    print("spectators got %d messages" % results.deltas)
+    print("server: %.0f%% of one core, %d sessions open" % (
+        100 * (after['cpu'] - before['cpu']) / after['wall'], after['sessions']))
+    if after['max_rss'] is not None and sessions:
+        print("server peak memory %d KiB, %.1f KiB more per session" % (
+            after['max_rss'], (after['max_rss'] - before['max_rss']) / float(sessions)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Put a Minesweeper game server under load")
+    parser.add_argument('address', help="HOST:PORT, or the path of a Unix socket")
+    parser.add_argument('--spawn', action='store_true', help="start the server at the address")
+    parser.add_argument('--sessions', type=int, default=1000, help="players, each in a session of its own")
+    parser.add_argument('--spectators', type=int, default=0, help="spectators per session")
+    parser.add_argument('--size', default='small', help="small, medium, large or HxW/MINES")
+    parser.add_argument('--pace', type=float, default=2.0, help="moves a second per player")
+    parser.add_argument('--seconds', type=float, default=10.0, help="duration after the ramp-up")
+    parser.add_argument('--ramp', type=float, default=2.0, help="seconds to open the sessions over")
+    parser.add_argument('--processes', type=int, default=None, help="client processes")
+    args = parser.parse_args()
+
+    size = simulate.parse_config(args.size)
+    server.raise_file_limit()
+    spawned = None
+    if args.spawn:
+        spawned = subprocess.Popen([sys.executable, server.__file__, '--listen', args.address],
+                                   stdout=subprocess.PIPE)
+        spawned.stdout.readline()   # "listening on ..."
+    try:
+        results, before, after = run(args.address, args.sessions, args.spectators, size, args.pace,
+                                     args.seconds, args.ramp, args.processes or multiprocessing.cpu_count())
+    finally:
+        if spawned is not None:
+            spawned.terminate()
+            spawned.wait()
+    report(results, before, after, args.sessions, after['wall'])
+
+if __name__ == '__main__':
+    main()
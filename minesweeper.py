@@ -6,9 +6,11 @@ A remake of the classic Minesweeper game, with class structures
 --------------------Miroslav Georgiev--------------------------
 """
 
-import pygame, random, sys
+import argparse, json, os, pygame, random, select, socket, sys, time
+from collections import deque, OrderedDict
 import sqlite3 as lite
 from pygame.locals import *
+import assets, engine, solver, generator, replay, history, profiler
 
 # Constants
 FPS = 30
@@ -17,11 +19,23 @@ GAP = 1
 MARGIN = 5
 SIDELINE = 70
 EXPLOSION_DIM = (128, 128)
-SIZE_REFERENCE = {10: 'small', 40: 'medium', 100: 'large'}
 FONT_REFERENCE = {9: 22, 16: 26, 30: 30}
-NEW_GAME_REFERENCE = {'small': [9, 9, 10],
-                      'medium': [16, 16, 40],
-                      'large': [16, 30, 100]}
+FONT_NAME = "TimesNewRoman"
+DIGIT_FONT_SIZE = 22   # of the hint digits, at the default zoom
+ZOOM_LEVELS = (10, 15, 20, 30, 40, 50, 60)    # cell sizes in pixels; BOXSIZE is the default
+# the panel below the board needs the width of a small board at the default zoom
+MIN_SCREEN_WIDTH = MARGIN + (BOXSIZE + GAP) * 9 + MARGIN
+TEXT_CACHE_SIZE = 256  # rendered text surfaces kept by TEXT_CACHE
+OVERLAY_ALPHA = 110    # opacity of the mine probability overlay
+OVERLAY_STEPS = 10     # the overlay shows probabilities rounded to tenths
+SAVE_VERSION = 2       # layout of the saved_game table; 1 was the six text tables
+JOURNAL_BATCH = 20     # moves journaled per commit, besides the commit at every clock tick
+JOURNAL_COMPACT = 1000 # moves journaled before they are folded into a new snapshot
+REPLAY_DIR = "replays" # a replay of every finished game is saved here
+# Phases of a frame of the game loop, as timed by PROFILER
+PROFILE_PHASES = ('events', 'reveal', 'mark', 'bot', 'other', 'probabilities',
+                  'board', 'cells', 'panel', 'blit', 'overlay', 'update', 'tick')
+PROFILE_REFRESH = 0.5  # seconds between updates of the frame timing overlay
 
 # Define some colors
 BLACK    = (   0,   0,   0)
@@ -39,317 +53,247 @@ SILVER   = ( 190, 190, 190)
 NUMBER_COLORS = {1: BLUE, 2: GREEN, 3: RED, 4: PURPLE,
                  5: TEAL, 6: YELLOW, 7: AQUA, 8: SILVER}
 BGCOLOR = BLACK
+# Images by name; the tiles drawn for every cell share one atlas surface
+IMAGES = {'box': 'box_image.png', 'mine': 'mine_image.png', 'question': 'question.png',
+          'button': 'button_medium.png', 'explosion': 'explosion_alpha.png'}
+TILES = ('box', 'mine', 'question')
+ASSETS = assets.Assets(IMAGES, TILES, os.path.dirname(os.path.abspath(__file__)))
 
-# Helper Queue class
-class Queue:
+class Text_cache():
     """
-    A simple implementation of a FIFO queue.
+    A cache of rendered text surfaces, keyed by (text, font, color). Texts
+    rendered ahead of time with preload are kept for good; any other text,
+    such as the ever changing counters, goes into a bounded LRU.
+    The surfaces are shared, so callers must only blit them.
     """
-    def __init__(self):
-        """ 
-        Initialize the queue.
-        """
-        self._items = []
+    def __init__(self, max_size=TEXT_CACHE_SIZE):
+        self._max_size = max_size
+        self._static = {}               # preloaded surfaces, never evicted
+        self._surfaces = OrderedDict()  # the LRU of the other surfaces
 
     def __len__(self):
-        """
-        Return the number of items in the queue.
-        """
-        return len(self._items)
-    
-    def __iter__(self):
-        """
-        Create an iterator for the queue.
-        """
-        for item in self._items:
-            yield item
+        return len(self._static) + len(self._surfaces)
 
-    def __str__(self):
+    def render(self, text, font, color):
         """
-        Return a string representation of the queue.
+        Return the surface for text, rendering it only on a cache miss.
         """
-        return str(self._items)
+        key = (text, font, color)
+        surface = self._static.get(key)
+        if surface is not None:
+            return surface
+        surface = self._surfaces.pop(key, None)
+        if surface is None:
+            surface = font.render(text, True, color)
+            if len(self._surfaces) >= self._max_size:
+                self._surfaces.popitem(last=False)   # evict the least recently used
+        self._surfaces[key] = surface
+        return surface
 
-    def enqueue(self, item):
+    def preload(self, texts, font, color):
         """
-        Add item to the queue.
-        """        
-        self._items.append(item)
-
-    def dequeue(self):
-        """
-        Remove and return the least recently inserted item.
+        Render a sequence of texts ahead of time, to be kept for good.
         """
-        return self._items.pop(0)
+        for text in texts:
+            key = (text, font, color)
+            if key not in self._static:
+                surface = self._surfaces.pop(key, None)
+                if surface is None:
+                    surface = font.render(text, True, color)
+                self._static[key] = surface
 
     def clear(self):
-        """
-        Remove all items from the queue.
-        """
-        self._items = []
-
-# Main Minesweeper class
-class Minefield():
-    def __init__(self, height, width, num_mines, saved_field=None):
-        """ Initialize a minefield with height number of rows,
-            width number of columns and num_mines number of mines.
-            Optional - pass an existing minefield. """
-        if saved_field:
-            # Used to continue a Saved game; if a previous minefield was passed, get its data
-            self.retrieve_state(saved_field)
-        else:  
-            # Set a new minefield according to given width, height and num_mines
-            self._height = height            # minefield dimensions 
-            self._width = width
-            self._num_mines = num_mines      # number of mines in the minefield
-            self._revealed = [[False for num_rows in xrange(self._width)] # array of booleans 
-                              for num_cols in xrange(self._height)]       # holding revealed cells 
-            self._minefield = [[0 for num_rows in xrange(self._width)]  # array of numbers holding 
-                               for num_cols in xrange(self._height)]    # mines and hint numbers
-        self._size = SIZE_REFERENCE[self._num_mines]                   # for score tracking purposes     
-                                    
-    def __str__(self):
-        info = ""
-        for row in range(self._height):            
-            info += str(self._minefield[row])
-            info += "\n"
-        return info
-
-    def get_height(self):
-        return self._height
-
-    def get_width(self):
-        return self._width
-
-    def get_num_mines(self):
-        return self._num_mines              
-
-    def get_neighbors(self, row, col):
-        """ Return all neighbor cells to cell in row, col as a list of tuples """
-        ans = []
-        if row > 0:
-            ans.append((row - 1, col))
-        if row < self._height - 1:
-            ans.append((row + 1, col))
-        if col > 0:
-            ans.append((row, col - 1))
-        if col < self._width - 1:
-            ans.append((row, col + 1))
-        if (row > 0) and (col > 0):
-            ans.append((row - 1, col - 1))
-        if (row > 0) and (col < self._width - 1):
-            ans.append((row - 1, col + 1))
-        if (row < self._height - 1) and (col > 0):
-            ans.append((row + 1, col - 1))
-        if (row < self._height - 1) and (col < self._width - 1):
-            ans.append((row + 1, col + 1))
-        return ans
+        self._static.clear()
+        self._surfaces.clear()
+
+TEXT_CACHE = Text_cache()
+# Frame timing, shown with the f key or streamed with --profile-csv
+PROFILER = profiler.Profiler(PROFILE_PHASES)
 
+class Zoom():
+    """ The size the cells are drawn at, along with the tiles, marks and
+        hint digits at that size. They are scaled once when a zoom level is
+        first drawn and dropped when another one is chosen, so that drawing
+        never scales anything. """
+    def __init__(self, box=BOXSIZE):
+        self._box = box
+        self._images = None     # name -> tile, scaled
+        self._digits = None     # number -> (surface, offset in the cell)
+
+    def get_box(self):
+        return self._box
+
+    def get_pitch(self):
+        """ Return the distance between the corners of neighbor cells """
+        return self._box + GAP
+
+    def set_box(self, box):
+        if box != self._box:
+            self._box = box
+            self._images = None
+            self._digits = None
+
+    def zoom(self, steps):
+        """ Move steps zoom levels in, or out if steps is negative; return
+            False if there is no level further that way """
+        index = ZOOM_LEVELS.index(self._box) + steps
+        if index < 0 or index >= len(ZOOM_LEVELS):
+            return False
+        self.set_box(ZOOM_LEVELS[index])
+        return True
+
+    def fit(self, minefield, screen_size):
+        """ Zoom out as far as needed for minefield to fit on screen_size """
+        for box in reversed(ZOOM_LEVELS):
+            if box <= self._box and \
+                   MARGIN + (box + GAP) * minefield.get_width() + MARGIN <= screen_size[0] and \
+                   MARGIN + (box + GAP) * minefield.get_height() + MARGIN + SIDELINE <= screen_size[1]:
+                break
+        self.set_box(box)
+
+    def get_image(self, name):
+        """ Return the box, mine or question tile at this zoom """
+        if self._images is None:
+            self._images = {}
+            for tile in TILES:
+                image = ASSETS.get_image(tile)
+                if image.get_size() != (self._box, self._box):
+                    image = pygame.transform.smoothscale(image, (self._box, self._box))
+                self._images[tile] = image
+        return self._images[name]
+
+    def get_digit(self, number):
+        """ Return the surface of a hint digit at this zoom, and where it
+            goes in its cell """
+        if self._digits is None:
+            font = ASSETS.get_font(FONT_NAME, max(1, DIGIT_FONT_SIZE * self._box // BOXSIZE))
+            offset = (10 * self._box // BOXSIZE, 3 * self._box // BOXSIZE)
+            self._digits = dict((digit, (font.render(str(digit), True, color), offset))
+                                for digit, color in NUMBER_COLORS.items())
+        return self._digits[number]
+
+ZOOM = Zoom()
+
+# Main Minesweeper classes, drawing on top of the engine's game logic
+class Minefield(engine.Minefield):
+    """ A minefield that can draw itself """
     def get_cell_clicked(self, x, y):
-        """ Return contents of clicked cell """
-        cell_x = y // (BOXSIZE + GAP)
-        cell_y = x // (BOXSIZE + GAP)        
+        """ Return the cell at x, y pixels from the board's top left corner """
+        cell_x = y // ZOOM.get_pitch()
+        cell_y = x // ZOOM.get_pitch()
         return  (cell_x, cell_y)
     
-    def build_grid(self, cell_clicked):
-        """ Build a two-dimensional array where 0 represents an empty space,
-            9 represents a mine, and numbers 1 - 8 inform how many mines
-            there are nearby. """
-        # seed mines
-        self.seed_mines(cell_clicked)
-        # update other fields with numbers according to nearby mines
-        for row in range(self._height):
-            for col in range(self._width):
-                if self._minefield[row][col] == 9:
-                    continue
-                cell = (row, col)
-                neighbors = self.get_neighbors(cell[0], cell[1])
-                number = 0
-                for neighbor in neighbors:
-                    if self._minefield[neighbor[0]][neighbor[1]] == 9:
-                        number += 1
-                self._minefield[row][col] = number          
-
-    def seed_mines(self, cell_clicked):
-        """ Update self._minefield with self._num_mines
-            placed randomly. """
-        self._mine_locs = [] # array to keep track of mine locations
-        rem_mines = self._num_mines
-        while rem_mines > 0:
-            # choose a random location
-            random_loc = (random.randrange(self._height),
-                          random.randrange(self._width))
-            if random_loc == cell_clicked:
-                # don't put a mine in the cell clicked
-                continue
-            elif self._minefield[random_loc[0]][random_loc[1]] == 9:
-                # skip the cell if there's already a mine there
-                continue
-            else:
-                # place a mine
-                self._minefield[random_loc[0]][random_loc[1]] = 9
-                self._mine_locs.append(random_loc)
-                rem_mines -= 1
-        self._mine_locs = sorted(self._mine_locs)        
-
-    def reveal(self, cell):
-        """ Reveal a given cell """
-        self._revealed[cell[0]][cell[1]] = True
-
-    def mass_reveal(self, cell):
-        """ Reveal recursively given cell and all other neighbor empty cells """
-        neighbors = self.get_neighbors(cell[0], cell[1])
-
-        for neighbor in neighbors:
-            if self._revealed[neighbor[0]][neighbor[1]]:
-                continue
-            else:
-                self._revealed[neighbor[0]][neighbor[1]] = True
-                if self._minefield[neighbor[0]][neighbor[1]] == 0:
-                    self.mass_reveal(neighbor)                    
-               
-    def retrieve_state(self, saved_data):
-        """ Set class fields according to saved_data.
-            Saved_data is a dictionary """
-        self._height = saved_data['height']
-        self._width = saved_data['width']
-        self._num_mines = saved_data['num_mines']
-        self._minefield = saved_data['minefield']
-        self._revealed = saved_data['revealed']
-        self._mine_locs = saved_data['mine_locs']        
+    def get_visible(self, surface):
+        """ Return the first row, the row past the last one, the first column
+            and the column past the last one of the cells in the clip area
+            of the surface """
+        pitch = ZOOM.get_pitch()
+        clip = surface.get_clip()
+        return (max(0, (clip.top - MARGIN) // pitch),
+                min(self._height, (clip.bottom - MARGIN + pitch - 1) // pitch),
+                max(0, (clip.left - MARGIN) // pitch),
+                min(self._width, (clip.right - MARGIN + pitch - 1) // pitch))
 
     def draw(self, surface):
-         for x_dim in range(self._width):
-            for y_dim in range(self._height):                
-                if self._revealed[y_dim][x_dim]:                    
-                     pygame.draw.rect(surface, WHITE, [(GAP + BOXSIZE) * x_dim + MARGIN,
-                                                 (GAP + BOXSIZE) * y_dim + MARGIN,
-                                                 BOXSIZE, BOXSIZE])
-                     if self._minefield[y_dim][x_dim] == 0 or self._minefield[y_dim][x_dim] == 9:
-                         continue                     
-                     number_surf = self.draw_number(surface, self._minefield[y_dim][x_dim],
-                                                    FONT1, NUMBER_COLORS[self._minefield[y_dim][x_dim]])
-                     surface.blit(number_surf, ((GAP + BOXSIZE) * x_dim + MARGIN + 10,
-                                  (GAP + BOXSIZE) * y_dim + MARGIN + 3))
+         """ Draw the cells in the clip area of the surface; on a huge board
+             a full redraw only goes through the cells on screen """
+         top, bottom, left, right = self.get_visible(surface)
+         if top >= bottom or left >= right:
+             return
+         if self._use_arrays:
+             minefield = self._minefield[top:bottom, left:right].tolist()
+             revealed = self._revealed[top:bottom, left:right].tolist()
+         else:
+             minefield = [row[left:right] for row in self._minefield[top:bottom]]
+             revealed = [row[left:right] for row in self._revealed[top:bottom]]
+         box_image = ZOOM.get_image('box')
+         box = ZOOM.get_box()
+         pitch = ZOOM.get_pitch()
+         for x_dim in range(left, right):
+            for y_dim in range(top, bottom):
+                number = minefield[y_dim - top][x_dim - left]
+                if revealed[y_dim - top][x_dim - left]:
+                     pygame.draw.rect(surface, WHITE, [pitch * x_dim + MARGIN,
+                                                 pitch * y_dim + MARGIN,
+                                                 box, box])
+                     if number == 0 or number == 9:
+                         continue
+                     number_surf, offset = ZOOM.get_digit(number)
+                     surface.blit(number_surf, (pitch * x_dim + MARGIN + offset[0],
+                                  pitch * y_dim + MARGIN + offset[1]))
                 else:
-                     surface.blit(box_image, ((GAP + BOXSIZE) * x_dim + MARGIN,
-                                                 (GAP + BOXSIZE) * y_dim + MARGIN))                                                                  
-                     
-    def draw_number(self, surface, number, font, color):
-        return font.render(str(number), True, color)
-
-class Game_parameters():
-    """ Class manipulating the rest of game parameters """
-    def __init__(self, remaining_mines, saved_data=None):
-        if saved_data:
-            # Pass saved data, if any
-            self.retrieve_info(saved_data)
-        else:           
-            self._marked_fields = [] # holds mines marked by player
-            self._questions = []     # holds fields marked as questionable by player
-            self._timer = 0          # measures game time
-            self._remaining_mines = remaining_mines  # holds number of remaining mines for
-            self._first_click = True    # keep track of the first mouseclick to start timer and other stuff
-        self._font1 = pygame.font.SysFont("TimesNewRoman", 22)
-        self._font2 = pygame.font.SysFont("TimesNewRoman", 16)        
-        self._in_progress = True    # keep track of whether the game is still in progress for saving purposes
-       
-    def get_time(self):
-        return self._timer
-
-    def get_remaining_mines(self):
-        return self._remaining_mines   
+                     surface.blit(box_image, (pitch * x_dim + MARGIN,
+                                                 pitch * y_dim + MARGIN))
 
+    def get_cell_rect(self, row, col):
+        """ Return the screen rect occupied by a cell """
+        return pygame.Rect(ZOOM.get_pitch() * col + MARGIN, ZOOM.get_pitch() * row + MARGIN,
+                           ZOOM.get_box(), ZOOM.get_box())
+
+    def draw_cell(self, surface, row, col):
+        """ Draw a single cell, covered or revealed """
+        rect = self.get_cell_rect(row, col)
+        if not self.is_revealed(row, col):
+            surface.blit(ZOOM.get_image('box'), rect.topleft)
+            return
+        pygame.draw.rect(surface, WHITE, rect)
+        number = self.get_cell(row, col)
+        if number == 0 or number == 9:
+            return
+        number_surf, offset = ZOOM.get_digit(number)
+        surface.blit(number_surf, (rect.left + offset[0], rect.top + offset[1]))
+
+class ChunkedMinefield(engine.ChunkedMinefield, Minefield):
+    """ A lazily generated minefield that draws the part fitting on screen """
+    def draw(self, surface):
+        """ Draw only the cells in the clip area of the surface, so that
+            only their tiles get generated """
+        top, bottom, left, right = self.get_visible(surface)
+        for x_dim in range(left, right):
+            for y_dim in range(top, bottom):
+                self.draw_cell(surface, y_dim, x_dim)
+
+class Game_parameters(engine.Game_parameters):
+    """ Game parameters along with the screen layout and the panel drawing """
     def define_screensize(self, minefield):
         """ Define the screen dimensions using the minefield dimensions """
         self._screensize_x = minefield.get_width()
         self._screensize_y = minefield.get_height()
-        self._screen_middle = ((MARGIN + (BOXSIZE + GAP) * self._screensize_x + MARGIN) // 2,
-                              (MARGIN + (BOXSIZE + GAP) * self._screensize_y + MARGIN + SIDELINE) // 2)
-        self._font3 = pygame.font.SysFont("TimesNewRoman", FONT_REFERENCE[minefield.get_width()])
+        screensize = get_screen_size(minefield)
+        self._screen_middle = (screensize[0] // 2, screensize[1] // 2)
+        self._font3 = ASSETS.get_font(FONT_NAME, get_font_size(minefield.get_width()))
 
     def get_screen_dimensions(self):
         return self._screensize_x, self._screensize_y, self._screen_middle
 
-    def mark_field(self, cell, lst):
-        """ Insert a mark into the list lst in appropriate order """
-        if not lst:
-            lst.append(cell)
-        else:           
-            # first check edge cases to avoid looping
-            if cell < lst[0]:
-                lst.insert(0, cell)
-            elif cell > lst[-1]:
-                lst.append(cell)
-            else:
-                for marked in lst:
-                    if marked < cell:                        
-                        continue  # cell is still bigger than marked
-                    elif marked == cell:
-                        # cell is on the same row as marked; check the column
-                        if marked[1] < cell[1]:                            
-                            continue
-                        else:                            
-                            lst.insert(lst.index(marked), cell)
-                            break
-                    else:                        
-                        lst.insert(lst.index(marked), cell)  
-                        break
-        if lst == self._marked_fields:
-            self._remaining_mines -= 1
-
-    def unmark_mine(self, mine):
-        """ Remove a mine from the list of marked mines """
-        self.mark_field(self._marked_fields.pop(self.find_mine(mine, self._marked_fields, self._marked_fields)),
-                        self._questions)
-        self._remaining_mines += 1        
-
-    def unmark_question(self, field):
-        """ Remove a question mark from the list self._questions """
-        self._questions.pop(self.find_mine(field, self._questions, self._questions))
-
-    def close_game(self):
-        self._in_progress = False
-
-    def check_first_click(self):
-        self._first_click = False
-
-    def find_mine(self, mine, mine_list, original_list):
-        """ Do a binary search to find a mine in the list of marked mines;
-            Return its index """
-        if mine_list[0] == mine:            
-            return original_list.index(mine_list[0])
-        else:
-            current = mine_list[len(mine_list) // 2]
-            upper = mine_list[len(mine_list) // 2 + 1:]
-            lower = mine_list[:len(mine_list) // 2]
-
-            if current == mine:                
-                return original_list.index(current)
-            else:               
-                if mine > current :
-                    return self.find_mine(mine, upper, original_list)
-                elif mine < current:
-                    return self.find_mine(mine, lower, original_list)                    
-                 
-    def retrieve_info(self, data):
-        """ Get fields from saved data """        
-        self._timer = data['timer']
-        self._remaining_mines = data['remaining']
-        self._marked_fields = data['marked']
-        self._questions = data['questions']
-        self._first_click = False   
-        
     def draw(self, canvas, screensize):
         """ Draw the interface below the playfield, as well as
             marked mines and question marks """
-        for mark in state._marked_fields:
-            canvas.blit(mine_image, ((BOXSIZE + GAP) * mark[1] + MARGIN,
-                                     (BOXSIZE + GAP) * mark[0]  + MARGIN))
-        for question in state._questions:
-            canvas.blit(question_image, ((BOXSIZE + GAP) * question[1] + MARGIN,
-                                     (BOXSIZE + GAP) * question[0]  + MARGIN))     
-        
+        self.draw_marks(canvas)
+        self.draw_panel(canvas, screensize)
+
+    def draw_marks(self, canvas):
+        """ Draw all marked mines and question marks """
+        mine_image = ZOOM.get_image('mine')
+        question_image = ZOOM.get_image('question')
+        pitch = ZOOM.get_pitch()
+        for mark in self._marked_fields:
+            canvas.blit(mine_image, (pitch * mark[1] + MARGIN,
+                                     pitch * mark[0]  + MARGIN))
+        for question in self._questions:
+            canvas.blit(question_image, (pitch * question[1] + MARGIN,
+                                     pitch * question[0]  + MARGIN))     
+
+    def draw_cell_mark(self, canvas, cell):
+        """ Draw the mark of a single cell, if it has one """
+        position = (ZOOM.get_pitch() * cell[1] + MARGIN, ZOOM.get_pitch() * cell[0] + MARGIN)
+        if cell in self._marked_fields:
+            canvas.blit(ZOOM.get_image('mine'), position)
+        elif cell in self._questions:
+            canvas.blit(ZOOM.get_image('question'), position)
+
+    def draw_panel(self, canvas, screensize):
+        """ Draw the timer and the mines counter below the playfield """
         pygame.draw.rect(canvas, WHITE, [screensize[0] - 100, screensize[1] - 40, 40, 30])
         pygame.draw.rect(canvas, WHITE, [55, screensize[1] - 40, 50, 30])
         # draw timer
@@ -364,92 +308,642 @@ class Game_parameters():
                                   screensize[1] - 38))
         canvas.blit(rem_mines, ((screensize[0] - 81) - rem_mines_rect.centerx,
                                screensize[1] - 65))
-        
+
+# The game being played; grid and state below always refer to its parts
+ENGINE = engine.GameEngine(Minefield, ChunkedMinefield, Game_parameters)
+# The bot behind the hint (h), step (s), auto-play (a) and probability overlay (p) keys
+SOLVER = solver.Solver(ENGINE)
+# No-guess boards (n) come from a pool of worker processes, started on demand
+GENERATOR = generator.Generator()
+ENGINE.set_seed_finder(GENERATOR.find_seed)
+NO_GUESS = False
+# Pressing left and right together and letting go of either chords like a
+# middle click; the release of the other button is then ignored
+OTHER_BUTTON = {1: 3, 3: 1}
+HELD_BUTTONS = set()
+IGNORED_RELEASES = set()
+# Events fetched along with a click but left for the next call of next_events
+QUEUED_EVENTS = deque()
+
+class Renderer():
+    """ Retained-mode drawing of the playfield. The board is kept on a
+        background surface; every frame only the cells invalidated since the
+        previous frame are repainted, and just their rects are returned for
+        pygame.display.update. """
+    def __init__(self, size):
+        self._dirty = set()      # cells to repaint on the next frame
+        self._redraw = True      # repaint the whole background
+        self._reblit = True      # copy the whole background to the screen
+        self._panel = None       # (time, remaining mines) last drawn in the panel
+        self._highlight = None   # cell outlined as a hint
+        self._overlay = None     # ({cell: mine probability}, probability elsewhere)
+        self._profile_shown = False
+        self._profile = None     # surface of the frame timing overlay
+        self._profile_rect = None
+        self._profile_time = 0   # when the overlay was last brought up to date
+        self.resize(size)
+
+    def resize(self, size):
+        """ Draw on a screen of another size, e.g. at another zoom """
+        self._background = pygame.Surface(size)
+        self._redraw = True
+        self._reblit = True
+        self._profile_rect = None
+        # translucent tiles from green (safe) to red (mine) for the overlay
+        self._overlay_tiles = []
+        for step in range(OVERLAY_STEPS + 1):
+            tile = pygame.Surface((ZOOM.get_box(), ZOOM.get_box()), SRCALPHA)
+            tile.fill((255 * step // OVERLAY_STEPS, 255 * (OVERLAY_STEPS - step) // OVERLAY_STEPS,
+                       0, OVERLAY_ALPHA))
+            self._overlay_tiles.append(tile)
+
+    def reset(self):
+        """ Repaint everything on the next frame, e.g. for a new minefield """
+        self._redraw = True
+        self._highlight = None
+
+    def set_highlight(self, cell):
+        """ Outline cell as a hint, or remove the outline with None """
+        if self._highlight is not None:
+            self._dirty.add(self._highlight)
+        if cell is not None:
+            self._dirty.add(cell)
+        self._highlight = cell
+
+    def set_overlay(self, probabilities):
+        """ Tint the covered cells by their mine probability, as returned by
+            Solver.get_probabilities, or remove the tint with None """
+        self._overlay = probabilities
+        self._redraw = True
+
+    def show_profile(self, shown):
+        """ Show or hide the frame timing of PROFILER over the board """
+        self._profile_shown = shown
+        self._profile = None
+        self._reblit = True
+
+    def is_showing_profile(self):
+        return self._profile_shown
+
+    def _draw_profile(self, screen):
+        """ Draw the frame timing overlay; return its rect """
+        now = time.time()
+        if self._profile is None or now - self._profile_time >= PROFILE_REFRESH:
+            # the numbers change all the time; render them outside of TEXT_CACHE
+            lines = ["%.1f fps" % PROFILER.get_fps()]
+            lines.extend("%s %.2f / %.2f ms" % stat for stat in PROFILER.get_stats())
+            texts = [FONT3.render(line, True, WHITE) for line in lines]
+            height = FONT3.get_linesize()
+            self._profile = pygame.Surface((max(text.get_width() for text in texts) + 8,
+                                            height * len(texts) + 6), SRCALPHA)
+            self._profile.fill((0, 0, 0, 190))
+            for index, text in enumerate(texts):
+                self._profile.blit(text, (4, 3 + index * height))
+            self._profile_time = now
+        rect = self._profile.get_rect(topleft=(MARGIN, MARGIN))
+        if self._profile_rect is not None:
+            # the overlay may have shrunk since the last frame
+            rect = rect.union(self._profile_rect)
+        screen.blit(self._background, rect, rect)
+        screen.blit(self._profile, (MARGIN, MARGIN))
+        self._profile_rect = self._profile.get_rect(topleft=(MARGIN, MARGIN))
+        return rect
+
+    def _draw_overlay(self, minefield, cell):
+        if minefield.is_revealed(cell[0], cell[1]):
+            return
+        chance = self._overlay[0].get(cell, self._overlay[1])
+        rect = minefield.get_cell_rect(cell[0], cell[1])
+        self._background.blit(self._overlay_tiles[int(round(chance * OVERLAY_STEPS))], rect)
+
+    def expose(self):
+        """ Something else drew over the screen; restore it from the background """
+        self._reblit = True
+
+    def invalidate(self, cells):
+        """ Mark cells whose contents changed """
+        self._dirty.update(cells)
+
+    def has_changes(self):
+        """ Return True if the next render is known to draw something """
+        return self._redraw or self._reblit or bool(self._dirty)
+
+    def render(self, screen, minefield, params):
+        """ Bring the screen up to date and return the list of changed rects """
+        size = screen.get_size()
+        rects = []
+        if self._redraw:
+            self._background.fill(BGCOLOR)
+            minefield.draw(self._background)
+            params.draw(self._background, size)
+            if self._overlay is not None:
+                for row in range(minefield.get_height()):
+                    for col in range(minefield.get_width()):
+                        self._draw_overlay(minefield, (row, col))
+            self._panel = (params.get_time(), params.get_remaining_mines())
+            self._dirty.clear()
+            if self._highlight is not None:
+                self._dirty.add(self._highlight)
+            self._redraw = False
+            self._reblit = True
+            PROFILER.lap('board')
+        for cell in self._dirty:
+            rect = minefield.get_cell_rect(cell[0], cell[1])
+            self._background.fill(BGCOLOR, rect)
+            minefield.draw_cell(self._background, cell[0], cell[1])
+            params.draw_cell_mark(self._background, cell)
+            if self._overlay is not None:
+                self._draw_overlay(minefield, cell)
+            if cell == self._highlight:
+                pygame.draw.rect(self._background, GREEN, rect, 3)
+            rects.append(rect)
+        self._dirty.clear()
+        PROFILER.lap('cells')
+        if self._panel != (params.get_time(), params.get_remaining_mines()):
+            board_bottom = MARGIN + ZOOM.get_pitch() * minefield.get_height()
+            rect = pygame.Rect(0, board_bottom, size[0], size[1] - board_bottom)
+            self._background.fill(BGCOLOR, rect)
+            params.draw_panel(self._background, size)
+            self._panel = (params.get_time(), params.get_remaining_mines())
+            rects.append(rect)
+        PROFILER.lap('panel')
+
+        if self._reblit:
+            screen.blit(self._background, (0, 0))
+            self._reblit = False
+            rects = [screen.get_rect()]
+        else:
+            for rect in rects:
+                screen.blit(self._background, rect, rect)
+        PROFILER.lap('blit')
+        if self._profile_shown:
+            rects.append(self._draw_profile(screen))
+            PROFILER.lap('overlay')
+        return rects
+
+DATABASE = None     # the connection to the game database, see get_database
+
+def get_database():
+    """ Return the connection to the game database. It is opened on first
+        use and kept until the program terminates. """
+    global DATABASE
+    if DATABASE is None:
+        DATABASE = history.connect("mines_data.db")
+    return DATABASE
+
+def get_history():
+    """ Return the history of the games finished on this machine """
+    return history.History(get_database())
+
+class Journal():
+    """ Crash-safe autosave. Once the mines are laid out, the game is saved
+        as a snapshot (the saved_game row) and every later move is appended
+        to the journal table as one small record; the records are committed
+        in batches and at every clock tick, and every JOURNAL_COMPACT moves
+        they are folded into a new snapshot. A game continued from the
+        database is its snapshot with the journal replayed on top. """
+    def __init__(self, game, connect):
+        self._game = game
+        self._connect = connect  # returns the database connection
+        self._active = False     # the game in progress has a snapshot
+        self._logged = 0         # moves journaled since the snapshot
+        self._pending = 0        # moves not committed yet
+        self._replaying = False
+        game.add_listener(self.on_change)
+        game.add_move_listener(self.record)
+
+    def _cursor(self):
+        return self._connect().cursor()
+
+    def on_change(self, changed):
+        if changed is None:
+            # a new game: it is journaled from its first reveal
+            self._active = False
+
+    def record(self, move, cell):
+        """ Move listener: append a move to the journal """
+        if self._replaying:
+            return
+        if self._game.is_over():
+            if self._active:
+                self.discard()
+            return
+        if not self._active:
+            if self._game.get_state() == engine.PLAYING:
+                self.snapshot()
+            return
+        self._cursor().execute("INSERT INTO journal VALUES(?, ?, ?, ?)",
+                               (move, cell[0], cell[1], self._game.get_params().get_time()))
+        self._logged += 1
+        self._pending += 1
+        if self._logged >= JOURNAL_COMPACT:
+            self.snapshot()
+        elif self._pending >= JOURNAL_BATCH:
+            self.flush()
+
+    def flush(self):
+        """ Commit the moves journaled so far """
+        if self._pending:
+            self._connect().commit()
+            self._pending = 0
+
+    def snapshot(self):
+        """ Save the whole game and empty the journal, in one transaction """
+        cursor = self._cursor()
+        create_save_table(cursor)
+        create_journal_table(cursor)
+        cursor.execute("DELETE FROM journal")
+        save_game(self._connect(), cursor, self._game.get_minefield(), self._game.get_params())
+        self._active = True
+        self._logged = 0
+        self._pending = 0
+
+    def discard(self):
+        """ Forget the saved game, e.g. once it is over """
+        cursor = self._cursor()
+        create_save_table(cursor)
+        create_journal_table(cursor)
+        cursor.execute("DELETE FROM saved_game")
+        cursor.execute("DELETE FROM journal")
+        self._connect().commit()
+        self._active = False
+        self._logged = 0
+        self._pending = 0
+
+    def replay(self, moves):
+        """ Play the journaled moves of a game just loaded from its
+            snapshot, then take a new snapshot """
+        self._replaying = True
+        try:
+            for move, row, col, timer in moves:
+                getattr(self._game, move)((row, col))
+        finally:
+            self._replaying = False
+        if moves:
+            self._game.tick(moves[-1][3] - self._game.get_params().get_time())
+        self.snapshot()
+
+    def finish(self, keep=True):
+        """ Commit the journal; unless keep, forget the game in progress """
+        if self._active and not keep:
+            self.discard()
+        self.flush()
+
+JOURNAL = Journal(ENGINE, get_database)
+# Every game started is recorded, and saved in REPLAY_DIR once it is over
+RECORDER = replay.Recorder(ENGINE)
 
 # ------------------------ Main program ---------------------------------------- #
-def main():
-    global SCREEN, SCREENSIZE, CLOCK, FONT1, FONT3
-    global grid, state, box_image, mine_image, question_image, med_button_image, explosion_image
+def use_current_game():
+    """ Point the grid and state globals at the parts of ENGINE's game """
+    global grid, state
+    grid = ENGINE.get_minefield()
+    state = ENGINE.get_params()
+
+def set_no_guess(no_guess):
+    """ Switch no-guess boards on or off for the next games """
+    global NO_GUESS
+    NO_GUESS = no_guess
+    if no_guess:
+        GENERATOR.start()
+        pygame.display.set_caption("My minesweeper (no guessing)")
+    else:
+        pygame.display.set_caption("My minesweeper")
+
+def get_font_size(width):
+    """ Return the counter font size for a board width; widths other than
+        the classic ones get the size of the nearest smaller classic width """
+    widths = [known for known in sorted(FONT_REFERENCE) if known <= width]
+    if not widths:
+        return FONT_REFERENCE[min(FONT_REFERENCE)]
+    return FONT_REFERENCE[widths[-1]]
+
+def play_bot_move():
+    """ Let SOLVER play one move; return the cells it changed """
+    move, changed = SOLVER.step()
+    PROFILER.lap('bot')
+    action, cell = move[:2]
+    if ENGINE.status()['state'] == engine.LOST:
+        rect = grid.get_cell_rect(cell[0], cell[1])
+        explode(rect.center)
+        game_over("You lose!")
+        RENDERER.reset()
+    elif ENGINE.status()['state'] == engine.WON:
+        game_over("You win!")
+        RENDERER.reset()
+    return changed
+
+def load_resources():
+    """ Start pygame and load the fonts; the images load as they are
+        first drawn, see ASSETS """
+    global CLOCK, FONT1, FONT3, DESKTOP_SIZE
 
     pygame.init()
+    info = pygame.display.Info()    # before any window is opened: the whole screen
+    DESKTOP_SIZE = (info.current_w, info.current_h)
     CLOCK = pygame.time.Clock()
     pygame.time.set_timer(USEREVENT+1, 1000)
-    FONT1 = pygame.font.SysFont("TimesNewRoman", 22)
-    FONT3 = pygame.font.SysFont("TimesNewRoman", 16)
+    pygame.event.set_blocked(MOUSEMOTION)    # nothing reacts to it; don't wake up for it
+    FONT1 = ASSETS.get_font(FONT_NAME, 22)
+    FONT3 = ASSETS.get_font(FONT_NAME, 16)
+    # the panel labels are drawn all the time, render them once; ZOOM has the digits
+    TEXT_CACHE.preload(["game time:", "mines remaining:"], FONT3, WHITE)
     pygame.display.set_caption("My minesweeper")
-    box_image = pygame.image.load('box_image.png')
-    mine_image = pygame.image.load('mine_image.png')
-    question_image = pygame.image.load('question.png')
-    med_button_image = pygame.image.load('button_medium.png')
-    explosion_image = pygame.image.load('explosion_alpha.png')
+
+def get_screen_size(minefield):
+    """ Return the size of the window for a minefield at the current zoom """
+    return (max(MIN_SCREEN_WIDTH, MARGIN + ZOOM.get_pitch() * minefield.get_width() + MARGIN),
+            MARGIN + ZOOM.get_pitch() * minefield.get_height() + MARGIN + SIDELINE)
+
+def resize_screen(fit=False):
+    """ Open the window at the size of the board of grid at the current
+        zoom; with fit, zoom out first if the board would not fit on the
+        desktop """
+    global SCREEN, SCREENSIZE
+    if fit and min(DESKTOP_SIZE) > 0:
+        ZOOM.fit(grid, DESKTOP_SIZE)
+    state.define_screensize(grid)
+    SCREENSIZE = get_screen_size(grid)
+    SCREEN = pygame.display.set_mode(SCREENSIZE)
+
+def main():
+    global SCREEN, SCREENSIZE, RENDERER
+
+    load_resources()
     # Start sequence
     start_game()
     
-    state.define_screensize(grid)      
-    GRIDSIZEX, GRIDSIZEY, MIDDLE = state.get_screen_dimensions()
-    SCREENSIZE = ((MARGIN + (BOXSIZE + GAP) * GRIDSIZEX + MARGIN),
-                  (MARGIN + (BOXSIZE + GAP) * GRIDSIZEY + MARGIN + SIDELINE))
-    SCREEN = pygame.display.set_mode(SCREENSIZE)
+    resize_screen(fit=True)
+    RENDERER = Renderer(SCREENSIZE)
+    autoplay = False
+    overlay_moves = None    # moves of the game when the overlay was computed, None if hidden
 
     while True:
-        # Main loop
-        click = check_for_mouseclick()
-        if click:               
-            mouse_x = click.pos[0] - 6
-            mouse_y = click.pos[1] - 6
-            if click.pos[0] < 5 or click.pos[0] > ((MARGIN + (BOXSIZE + GAP) * GRIDSIZEX)) or \
-                   click.pos[1] < 5 or click.pos[1] > ((MARGIN + (BOXSIZE + GAP) * GRIDSIZEY)):
+        # Main loop; sleeps until input or the timer arrives, unless the bot plays
+        click = check_for_mouseclick(RENDERER.has_changes() or autoplay)
+        PROFILER.lap('events')
+        if autoplay and not click:
+            RENDERER.invalidate(play_bot_move())
+            if ENGINE.status()['state'] == engine.READY:
+                autoplay = False        # the game ended and a new one was set up
+        elif click and click.type == KEYUP:
+            if click.key == K_h:
+                # hint: outline a cell that is certainly safe
+                RENDERER.set_highlight(SOLVER.get_safe_cell())
+            elif click.key == K_s:
+                RENDERER.set_highlight(None)
+                RENDERER.invalidate(play_bot_move())
+            elif click.key == K_a:
+                RENDERER.set_highlight(None)
+                autoplay = not autoplay
+            elif click.key == K_n:
+                set_no_guess(not NO_GUESS)
+                if ENGINE.get_state() == engine.READY and not isinstance(grid, engine.ChunkedMinefield):
+                    # not started yet; deal a board of the new kind right away
+                    ENGINE.new_game(grid.get_height(), grid.get_width(), grid.get_num_mines(),
+                                    no_guess=NO_GUESS)
+                    use_current_game()
+                    state.define_screensize(grid)
+                    RENDERER.reset()
+            elif click.key == K_f:
+                # show or hide the frame timing
+                if RENDERER.is_showing_profile():
+                    RENDERER.show_profile(False)
+                    PROFILER.disable()
+                else:
+                    PROFILER.enable()
+                    RENDERER.show_profile(True)
+            elif click.key == K_t:
+                show_stats(SCREEN, SCREENSIZE)
+                RENDERER.reset()
+            elif click.key in (K_EQUALS, K_PLUS, K_KP_PLUS, K_MINUS, K_KP_MINUS):
+                # zoom in or out; the window takes the size of the board
+                if ZOOM.zoom(-1 if click.key in (K_MINUS, K_KP_MINUS) else 1):
+                    resize_screen()
+                    RENDERER.resize(SCREENSIZE)
+            elif click.key == K_p:
+                # show or hide the mine probabilities
+                overlay_moves = -1 if overlay_moves is None else None
+                if overlay_moves is None:
+                    RENDERER.set_overlay(None)
+        elif click:
+            RENDERER.set_highlight(None)
+            autoplay = False
+            mouse_x = click.pos[0] - MARGIN
+            mouse_y = click.pos[1] - MARGIN
+            if not (0 <= mouse_x < ZOOM.get_pitch() * grid.get_width() and
+                    0 <= mouse_y < ZOOM.get_pitch() * grid.get_height()):
                    pass             # ignore click if outside the grid
             else:
                 cell = grid.get_cell_clicked(mouse_x, mouse_y)
-                if click.button == 1:
-                    if state._first_click:
-                        # build mines array and dependent data on the first click
-                        grid.build_grid(cell)
-                        state.check_first_click()                       
-                        if grid._minefield[cell[0]][cell[1]] == 0:
-                            grid.reveal(cell)
-                            grid.mass_reveal(cell)
-                        else:
-                            grid.reveal(cell)
+                if click.button == 1 or click.button == 2:
+                    # the engine builds the minefield on the first click; a middle
+                    # click reveals around a number whose mines are all marked
+                    if click.button == 1:
+                        RENDERER.invalidate(ENGINE.reveal(cell))
                     else:
-                        
-                        if grid._minefield[cell[0]][cell[1]] == 9:
-                            # you hit a mine, game over!
-                            explode(click.pos)
-                            game_over("You lose!")
-
-                        else:
-                            if grid._minefield[cell[0]][cell[1]] == 0:
-                                grid.reveal(cell)
-                                grid.mass_reveal(cell)
-                            else:
-                                grid.reveal(cell)
+                        RENDERER.invalidate(ENGINE.chord(cell))
+                    PROFILER.lap('reveal')
+                    if ENGINE.status()['state'] == engine.LOST:
+                        # you hit a mine, game over!
+                        explode(click.pos)
+                        game_over("You lose!")
+                        RENDERER.reset()
+                    elif ENGINE.status()['state'] == engine.WON:
+                        # every safe cell is revealed
+                        game_over("You win!")
+                        RENDERER.reset()
                     
                 elif click.button == 3:
-                    # handle right-clicks
-                    if cell in state._marked_fields:
-                        state.unmark_mine(cell)
-                    elif cell in state._questions:
-                        state.unmark_question(cell)
-                    else:
-                        if not grid._revealed[cell[0]][cell[1]]:
-                            state.mark_field(cell, state._marked_fields)
-                        if grid._mine_locs == state._marked_fields:
-                            game_over("You win!")                   
+                    # handle right-clicks: cycle mine mark / question mark / nothing
+                    RENDERER.invalidate(ENGINE.toggle_flag(cell))
+                    PROFILER.lap('mark')
+                    if ENGINE.status()['state'] == engine.WON:
+                        game_over("You win!")                   
+                        RENDERER.reset()
+        PROFILER.lap('other')
         
-        SCREEN.fill(BGCOLOR)
-        # drawing
-        grid.draw(SCREEN)
-        state.draw(SCREEN, SCREENSIZE)                  
-                
-        pygame.display.update()
+        if overlay_moves is not None and overlay_moves != ENGINE.status()['moves']:
+            RENDERER.set_overlay(SOLVER.get_probabilities())
+            overlay_moves = ENGINE.status()['moves']
+            PROFILER.lap('probabilities')
+
+        # drawing: only what changed since the last frame, if anything
+        rects = RENDERER.render(SCREEN, grid, state)
+        if rects:
+            pygame.display.update(rects)
+        PROFILER.lap('update')
+        CLOCK.tick(FPS)     # caps the frame rate during bursts of input
+        PROFILER.lap('tick')
+        PROFILER.end_frame()
+
+def watch_replay(path):
+    """ Play a replay file back in real time; the caption tells
+        whether it ends in its recorded position """
+    global SCREEN, SCREENSIZE, RENDERER, grid, state
+
+    recording = replay.load(path)
+    load_resources()
+    # a game of its own, so that it is neither journaled nor recorded
+    game = engine.GameEngine(Minefield, ChunkedMinefield, Game_parameters)
+    replay.start(game, recording)
+    grid = game.get_minefield()
+    state = game.get_params()
+    resize_screen(fit=True)
+    RENDERER = Renderer(SCREENSIZE)
+    pygame.display.set_caption("Replay: " + os.path.basename(path))
+
+    moves = replay.get_moves(recording)
+    upcoming = next(moves, None)
+    start = time.time()
+    while True:
+        for event in pygame.event.get():
+            if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
+                PROFILER.close()
+                pygame.quit()
+                sys.exit()
+            if event.type == USEREVENT+1:
+                game.tick()
+            if event.type == VIDEOEXPOSE:
+                RENDERER.expose()
+        PROFILER.lap('events')
+        while upcoming is not None and upcoming[0] <= time.time() - start:
+            elapsed, move, cell = upcoming
+            RENDERER.invalidate(getattr(game, move)(cell))
+            upcoming = next(moves, None)
+            if upcoming is None:
+                if replay.digest(game) == recording['digest']:
+                    pygame.display.set_caption("Replay: " + os.path.basename(path) + " - matches")
+                else:
+                    pygame.display.set_caption("Replay: " + os.path.basename(path) + " - MISMATCH")
+        PROFILER.lap('other')
+        rects = RENDERER.render(SCREEN, grid, state)
+        if rects:
+            pygame.display.update(rects)
+        PROFILER.lap('update')
+        CLOCK.tick(FPS)
+        PROFILER.lap('tick')
+        PROFILER.end_frame()
+
+def connect_to_server(address):
+    """ Open a socket to a game server (see server.py) at HOST:PORT, or
+        at the path of a Unix socket """
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        return socket.create_connection((host, int(port)))
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(address)
+    return connection
+
+def show_cells(minefield, params, cells):
+    """ Bring a board mirrored from a game server up to date with the
+        [row, col, value] cells of a message; return the cells """
+    changed = []
+    for row, col, value in cells:
+        cell = (row, col)
+        if params.is_marked(cell):
+            params.unmark_mine(cell, False)
+        params.unmark_question(cell)
+        if value == 'flag':
+            params.mark_mine(cell, False)
+        elif value == 'question':
+            params.mark_mine(cell, False)
+            params.unmark_mine(cell, False)     # mine -> question, like a right-click
+        elif value is not None:
+            minefield.show_cell(cell, value)
+        changed.append(cell)
+    return changed
+
+def watch_session(address, session_id):
+    """ Show a session of a game server as it is played, from the board
+        it sends first and the changed cells of every move after that """
+    global SCREEN, SCREENSIZE, RENDERER, grid, state
+
+    connection = connect_to_server(address)
+    connection.sendall(json.dumps({'op': 'watch', 'session': session_id}).encode('utf-8') + b'\n')
+    load_resources()
+    pygame.display.set_caption("Session " + str(session_id) + " on " + address)
+    received = b''
+    connected = True
+    game_state = None   # of the game watched, None until its board arrives
+    while True:
+        for event in pygame.event.get():
+            if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
+                connection.close()
+                PROFILER.close()
+                pygame.quit()
+                sys.exit()
+            if event.type == USEREVENT+1 and game_state == engine.PLAYING:
+                state._timer += 1
+            if event.type == VIDEOEXPOSE and game_state is not None:
+                RENDERER.expose()
+        PROFILER.lap('events')
+        while connected and select.select([connection], [], [], 0)[0]:
+            data = connection.recv(65536)
+            if not data:
+                pygame.display.set_caption("Session " + str(session_id) + " - disconnected")
+                connected = False
+            received += data
+        lines = received.split(b'\n')
+        received = lines.pop()      # the start of a message still coming
+        for line in lines:
+            message = json.loads(line.decode('utf-8'))
+            if message['op'] == 'board':
+                grid = Minefield(message['height'], message['width'], message['mines'])
+                state = Game_parameters(message['mines'])
+                resize_screen(fit=True)
+                RENDERER = Renderer(SCREENSIZE)
+                show_cells(grid, state, message['cells'])
+            elif message['op'] == 'delta':
+                RENDERER.invalidate(show_cells(grid, state, message['cells']))
+            elif message['op'] == 'closed':
+                pygame.display.set_caption("Session " + str(session_id) + " - closed")
+                continue
+            else:
+                pygame.display.set_caption("Session " + str(session_id) + ": " + message.get('message', ''))
+                continue
+            # the panel shows the counts of the server
+            game_state = message['state']
+            state._timer = message['time']
+            state._remaining_mines = message['remaining_mines']
+        PROFILER.lap('other')
+        if game_state is not None:
+            rects = RENDERER.render(SCREEN, grid, state)
+            if rects:
+                pygame.display.update(rects)
+        PROFILER.lap('update')
         CLOCK.tick(FPS)
+        PROFILER.lap('tick')
+        PROFILER.end_frame()
 
-def check_for_mouseclick():
+def save_replay():
+    """ Save the replay of the game just finished in REPLAY_DIR """
+    if not os.path.isdir(REPLAY_DIR):
+        os.makedirs(REPLAY_DIR)
+    RECORDER.save(os.path.join(REPLAY_DIR, time.strftime("%Y%m%d-%H%M%S") + ".replay"))
+
+def next_events(redraw_pending=False):
+    """ Return the pending events. Unless a redraw is pending, first block
+        until at least one event arrives, so that an idle screen costs no CPU;
+        the 1 Hz timer still wakes the game loop up every second. Events
+        left over by check_for_mouseclick come first, without blocking. """
+    if QUEUED_EVENTS:
+        events = list(QUEUED_EVENTS)
+        QUEUED_EVENTS.clear()
+        return events + pygame.event.get()
+    if redraw_pending:
+        return pygame.event.get()
+    return [pygame.event.wait()] + pygame.event.get()
+
+def check_for_mouseclick(redraw_pending=False):
     """ Check the event queue for MOUSECLICK and some other events; return
-        the first MOUSEBUTTONUP event """
-    for event in pygame.event.get():
+        the first MOUSEBUTTONUP event or released key other than escape.
+        A left+right chord is returned as a release of the middle button.
+        The events after the one returned are queued for the next call, so
+        that e.g. both releases of a chord update HELD_BUTTONS. """
+    events = next_events(redraw_pending)
+    for index, event in enumerate(events):
+        click = None
         if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
             if state._in_progress and state._first_click:
                 terminate()
@@ -460,14 +954,30 @@ def check_for_mouseclick():
                     terminate()
             else:
                 terminate()
-        if event.type == USEREVENT+1 and not state._first_click:
-            state._timer += 1
-        if event.type == MOUSEBUTTONUP:            
-            return event
+        if event.type == USEREVENT+1:
+            ENGINE.tick()
+            JOURNAL.flush()
+        if event.type == VIDEOEXPOSE:
+            RENDERER.expose()
+        if event.type == MOUSEBUTTONDOWN:
+            HELD_BUTTONS.add(event.button)
+        if event.type == MOUSEBUTTONUP:
+            HELD_BUTTONS.discard(event.button)
+            if event.button in IGNORED_RELEASES:
+                IGNORED_RELEASES.discard(event.button)
+                continue
+            if OTHER_BUTTON.get(event.button) in HELD_BUTTONS:
+                IGNORED_RELEASES.add(OTHER_BUTTON[event.button])
+                click = pygame.event.Event(MOUSEBUTTONUP, pos=event.pos, button=2)
+        if click is None and (event.type == MOUSEBUTTONUP or event.type == KEYUP):
+            click = event
+        if click is not None:
+            QUEUED_EVENTS.extend(events[index + 1:])
+            return click
 
 def makeText(text, font, color):
     """ Return a tuple of a text surface with given font and color, and a text rect """
-    textSurf = font.render(text, True, color)
+    textSurf = TEXT_CACHE.render(text, font, color)
     textRect = textSurf.get_rect()
     textRect.centerx = textRect.width // 2
     textRect.centery = textRect.height // 2
@@ -491,108 +1001,148 @@ def querry(surface, screensize, message):
         and buttons for a Yes / No answer """
     MIDDLE = (screensize[0] // 2, screensize[1] // 2)
     
-    yesButton, yesButtonRect = loadButton("Yes", BLACK, FONT3, med_button_image,
+    yesButton, yesButtonRect = loadButton("Yes", BLACK, FONT3, ASSETS.get_image('button'),
                                           MIDDLE[0] - 100, MIDDLE[1]) 
-    noButton, noButtonRect = loadButton("No, thanks", RED, FONT3,  med_button_image,
+    noButton, noButtonRect = loadButton("No, thanks", RED, FONT3,  ASSETS.get_image('button'),
                                         MIDDLE[0], MIDDLE[1])
     text, textRect = makeText(message, FONT1, BLACK)    
     
+    redraw = True
     while True:
-        for event in pygame.event.get():    # Event handling
+        if redraw:
+            surface.fill(BGCOLOR)
+            pygame.draw.rect(surface, WHITE, [MIDDLE[0] - 152, MIDDLE[1] - 67, 304, 134])
+            pygame.draw.rect(surface, SILVER, [MIDDLE[0] - 150, MIDDLE[1] - 65, 300, 130])
+            surface.blit(text, (MIDDLE[0] - textRect.centerx, MIDDLE[1] - 50))
+            surface.blit(yesButton, yesButtonRect)
+            surface.blit(noButton, noButtonRect)
+
+            pygame.display.update()
+            redraw = False
+
+        for event in next_events():    # Event handling
             if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
                 pygame.quit()
                 sys.exit()
+            if event.type == VIDEOEXPOSE:
+                redraw = True
             if event.type == MOUSEBUTTONUP:
                 if yesButtonRect.collidepoint(event.pos[0], event.pos[1]):
                     return True
                 elif noButtonRect.collidepoint(event.pos[0], event.pos[1]):
                     return False                    
-
-        surface.fill(BGCOLOR)
-        pygame.draw.rect(surface, WHITE, [MIDDLE[0] - 152, MIDDLE[1] - 67, 304, 134])
-        pygame.draw.rect(surface, SILVER, [MIDDLE[0] - 150, MIDDLE[1] - 65, 300, 130])
-        surface.blit(text, (MIDDLE[0] - textRect.centerx, MIDDLE[1] - 50))
-        surface.blit(yesButton, yesButtonRect)
-        surface.blit(noButton, noButtonRect)
-        
-        pygame.display.update()
-        CLOCK.tick(FPS)
     
+def show_stats(surface, screensize):
+    """ Show the statistics of every size played, until a click or a key """
+    sizes = ['small', 'medium', 'large']
+    if grid._size not in sizes:
+        sizes.append(grid._size)
+    records = get_history()
+    lines = []
+    for size in sizes:
+        stats = records.get_stats(size)
+        lines.append("%s: %d games, %d%% won" % (size, stats['games'], round(100 * stats['win_rate'])))
+        if stats['wins']:
+            lines.append("best %d, median %d, 90%% %d" % (stats['best'], stats['percentiles'][0.5],
+                                                         stats['percentiles'][0.9]))
+        lines.append("streak %d, longest %d" % (stats['streak'], stats['longest_streak']))
+        lines.append("")
+    title, titleRect = makeText("Statistics", FONT1, BLACK)
+    MIDDLE = (screensize[0] // 2, screensize[1] // 2)
+
+    redraw = True
+    while True:
+        if redraw:
+            surface.fill(SILVER)
+            surface.blit(title, (MIDDLE[0] - titleRect.centerx, 10))
+            top = 45
+            for line in lines:
+                if line:
+                    text, textRect = makeText(line, FONT3, BLACK)
+                    surface.blit(text, (MIDDLE[0] - textRect.centerx, top))
+                    top += 18
+                else:
+                    top += 10
+            pygame.display.update()
+            redraw = False
+
+        for event in next_events():
+            if event.type == QUIT:
+                pygame.event.post(event)    # leave quitting to the game loop
+                return
+            if event.type == VIDEOEXPOSE:
+                redraw = True
+            if event.type == MOUSEBUTTONUP or event.type == KEYUP:
+                return
+
 def start_game():
     """ Show the starting screen, do necessary stuff """
-    global grid, state
     GRIDSIZEX = 12
     GRIDSIZEY = 6
-    FONT = pygame.font.SysFont("TimesNewRoman", 22)
+    FONT = ASSETS.get_font(FONT_NAME, 22)
     SCREENSIZE = ((MARGIN + (BOXSIZE + GAP) * GRIDSIZEX + MARGIN),
               (MARGIN + (BOXSIZE + GAP) * GRIDSIZEY + MARGIN))
     MIDDLE = (SCREENSIZE[0] // 2, SCREENSIZE[1] // 2)
     screen = pygame.display.set_mode(SCREENSIZE)
     new_game = False
     
-    # access database file
-    con = lite.connect("mines_data.db")
+    # access database file; it is created on the very first game on a machine
+    con = get_database()
     cursor = con.cursor()
-    try:        
-        cursor.execute("SELECT best_time FROM results")        
-    except:
-        # the case of the very first game on a machine, when the DB hasn't been created yet
-        cursor.execute("CREATE TABLE results(id TEXT, best_time INT)")
-        con.commit()
-        con.close()
-    try:
-        # attempt to access a minefield record - if successful, ask         
-        cursor.execute("SELECT * FROM minefield")
-        if querry(screen, SCREENSIZE, "Continue your saved game?"):
-            # user decided to continue saved game; retrieve the data
-            grid_data, state_data = retrieve_saved_data(con, cursor)        
-            grid = Minefield(9, 9, 10, grid_data)           
-            state = Game_parameters(10, state_data)           
-            return   
-        else:
-            # user decided to start a new game, delete saved game data
-            drop_data(con, cursor)
-            con.commit()
-            con.close()
-            new_game = True
-    except:
-        # no saved game
-        con.close()
+    # games saved by older versions are converted first
+    migrate_saved_data(con, cursor)
+    saved = retrieve_saved_data(cursor)
+    if saved and querry(screen, SCREENSIZE, "Continue your saved game?"):
+        # user decided to continue saved game
+        grid_data, state_data = saved
+        moves = retrieve_journal(cursor)
+        ENGINE.load_game(Minefield(9, 9, 10, grid_data), Game_parameters(10, state_data))
+        JOURNAL.replay(moves)
+        use_current_game()
+        return
+    else:
+        # no saved game, or user decided to start a new game: delete saved game data
+        drop_data(con, cursor)
         new_game = True
 
     if new_game:    
-        smallButton, smallRect = loadButton("Small", BLACK, FONT1, med_button_image, 40, 100)
-        mediumButton, mediumRect = loadButton("Medium", BLACK, FONT1, med_button_image, 145, 100)
-        largeButton, largeRect = loadButton("Large", BLACK, FONT1, med_button_image, 250, 100)
+        # lay out a board of every size while the player chooses
+        for height, width, num_mines in ((9, 9, 10), (16, 16, 40), (16, 30, 100)):
+            ENGINE.prefetch(height, width, num_mines)
+        smallButton, smallRect = loadButton("Small", BLACK, FONT1, ASSETS.get_image('button'), 40, 100)
+        mediumButton, mediumRect = loadButton("Medium", BLACK, FONT1, ASSETS.get_image('button'), 145, 100)
+        largeButton, largeRect = loadButton("Large", BLACK, FONT1, ASSETS.get_image('button'), 250, 100)
         text, textRect = makeText("Please choose size of field:", FONT, WHITE)
         
         done = False
+        redraw = True
         while not done:
-            for event in pygame.event.get():    # Event handling
+            if redraw:
+                screen.fill(BGCOLOR)
+                screen.blit(text, (MIDDLE[0] - textRect.centerx, MIDDLE[1] - 60))
+                screen.blit(smallButton, smallRect)
+                screen.blit(mediumButton, mediumRect)
+                screen.blit(largeButton, largeRect)
+
+                pygame.display.update()
+                redraw = False
+
+            for event in next_events():    # Event handling
                 if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
                     terminate()
+                if event.type == VIDEOEXPOSE:
+                    redraw = True
                 if event.type == MOUSEBUTTONUP:
                     if smallRect.collidepoint(event.pos[0], event.pos[1]):
-                        grid = Minefield(9, 9, 10)
-                        state = Game_parameters(10)
+                        ENGINE.new_game(9, 9, 10, no_guess=NO_GUESS)
                         done = True
                     elif mediumRect.collidepoint(event.pos[0], event.pos[1]):
-                        grid = Minefield(16, 16, 40)
-                        state = Game_parameters(40)
+                        ENGINE.new_game(16, 16, 40, no_guess=NO_GUESS)
                         done = True
                     elif largeRect.collidepoint(event.pos[0], event.pos[1]):
-                        grid = Minefield(16, 30, 100)
-                        state = Game_parameters(100)
+                        ENGINE.new_game(16, 30, 100, no_guess=NO_GUESS)
                         done = True  
-
-            screen.fill(BGCOLOR)
-            screen.blit(text, (MIDDLE[0] - textRect.centerx, MIDDLE[1] - 60))
-            screen.blit(smallButton, smallRect)
-            screen.blit(mediumButton, mediumRect)
-            screen.blit(largeButton, largeRect)
-
-            pygame.display.update()
-            CLOCK.tick(FPS)       
+        use_current_game()
 
 def explode(pos):
     """ Draw the explosion animation and mine locations. 
@@ -605,10 +1155,10 @@ def explode(pos):
         state.draw(SCREEN, SCREENSIZE)
         # draw mine locations as red circles
         for mine in grid._mine_locs:
-            pygame.draw.circle(SCREEN, RED, (mine[1] * (BOXSIZE + GAP) + 20,
-                                             mine[0] * (BOXSIZE + GAP) + 20), 10)
+            pygame.draw.circle(SCREEN, RED, grid.get_cell_rect(mine[0], mine[1]).center,
+                               ZOOM.get_box() // 3)
         # draw the explosion animation    
-        SCREEN.blit(explosion_image, [pos[0] - EXPLOSION_DIM[0] // 2,
+        SCREEN.blit(ASSETS.get_image('explosion'), [pos[0] - EXPLOSION_DIM[0] // 2,
                                       pos[1] - EXPLOSION_DIM[1] //2,
                                       EXPLOSION_DIM[0], EXPLOSION_DIM[1]],
                     [EXPLOSION_DIM[0] * time, 0, EXPLOSION_DIM[0], EXPLOSION_DIM[1]])
@@ -621,11 +1171,21 @@ def explode(pos):
 def game_over(message):
     """ Terminate the game, either because player won
         or hit a mine. Update database as necessary. """
-    global grid, state
     state.close_game()
+    save_replay()
+    if not isinstance(grid, engine.ChunkedMinefield):
+        # lay out the next board while the player reads the result
+        ENGINE.prefetch(grid.get_height(), grid.get_width(), grid.get_num_mines())
     rec_message = ""
+    # every finished game goes into the history
+    seed = grid.get_seed()
+    if isinstance(seed, random.Random):
+        seed = None
+    bbbv = None if isinstance(grid, engine.ChunkedMinefield) else grid.get_3bv()
+    get_history().record(grid._size, seed, message == "You win!", state.get_time(),
+                         ENGINE.status()['moves'], bbbv, commit=False)
     # get previous results from the database, if any
-    con = lite.connect("mines_data.db")
+    con = get_database()
     cur = con.cursor()        
     cur.execute("SELECT best_time FROM results WHERE id=?", (grid._size,))
     rec = cur.fetchone()    
@@ -650,68 +1210,55 @@ def game_over(message):
         else:
             rec_message = "No best time yet"
     con.commit()
-    con.close()
 
     done = False
     GRIDSIZEX, GRIDSIZEY, MIDDLE = state.get_screen_dimensions()    
-    yesButton, yesButtonRect = loadButton("YES!!!", PURPLE, FONT1, med_button_image,
+    yesButton, yesButtonRect = loadButton("YES!!!", PURPLE, FONT1, ASSETS.get_image('button'),
                                           MIDDLE[0] - 100, MIDDLE[1] + 50) 
-    noButton, noButtonRect = loadButton("No, exit", RED, FONT1, med_button_image,
+    noButton, noButtonRect = loadButton("No, exit", RED, FONT1, ASSETS.get_image('button'),
                                         MIDDLE[0], MIDDLE[1] + 50)
     text, textRect = makeText(message, FONT1, RED)
     text2, text2Rect = makeText(rec_message, FONT3, BLACK)
     text3, text3Rect = makeText("Care for another game?", FONT3, BLACK)    
     
+    redraw = True
     while not done:
-        for event in pygame.event.get():
+        if redraw:
+            SCREEN.fill(SILVER)
+
+            SCREEN.blit(text, (MIDDLE[0] - textRect.centerx, MIDDLE[1] - 100))
+            SCREEN.blit(text2, (MIDDLE[0] - text2Rect.centerx, MIDDLE[1] - 50))
+            SCREEN.blit(text3, (MIDDLE[0] - text3Rect.centerx, MIDDLE[1]))
+
+            SCREEN.blit(yesButton, yesButtonRect)
+            pygame.draw.rect(SCREEN, GREEN, [yesButtonRect[0] - 3, yesButtonRect[1] - 3, yesButtonRect[2] + 5,
+                                              yesButtonRect[3] + 5], 4)
+            SCREEN.blit(noButton, noButtonRect)
+            pygame.draw.rect(SCREEN, RED, [noButtonRect[0] - 3, noButtonRect[1] - 3, noButtonRect[2] + 5,
+                                              noButtonRect[3] + 5], 4)
+
+            pygame.display.update()
+            redraw = False
+
+        for event in next_events():
             if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
                 terminate()
+            if event.type == VIDEOEXPOSE:
+                redraw = True
             if event.type == MOUSEBUTTONUP:
                 if yesButtonRect.collidepoint(event.pos[0], event.pos[1]):
-                    new_game_data = NEW_GAME_REFERENCE[grid._size]
-                    grid = Minefield(new_game_data[0], new_game_data[1], new_game_data[2])
-                    state = Game_parameters(new_game_data[2])
+                    chunked = isinstance(grid, engine.ChunkedMinefield)
+                    ENGINE.new_game(grid.get_height(), grid.get_width(), grid.get_num_mines(),
+                                    chunked=chunked, no_guess=NO_GUESS and not chunked)
+                    use_current_game()
                     state.define_screensize(grid)
                     done = True
                 elif noButtonRect.collidepoint(event.pos[0], event.pos[1]):
                     terminate()                        
-                
-        SCREEN.fill(SILVER)
-
-        SCREEN.blit(text, (MIDDLE[0] - textRect.centerx, MIDDLE[1] - 100))
-        SCREEN.blit(text2, (MIDDLE[0] - text2Rect.centerx, MIDDLE[1] - 50))
-        SCREEN.blit(text3, (MIDDLE[0] - text3Rect.centerx, MIDDLE[1]))
-        
-        SCREEN.blit(yesButton, yesButtonRect)
-        pygame.draw.rect(SCREEN, GREEN, [yesButtonRect[0] - 3, yesButtonRect[1] - 3, yesButtonRect[2] + 5,
-                                          yesButtonRect[3] + 5], 4)
-        SCREEN.blit(noButton, noButtonRect)
-        pygame.draw.rect(SCREEN, RED, [noButtonRect[0] - 3, noButtonRect[1] - 3, noButtonRect[2] + 5,
-                                          noButtonRect[3] + 5], 4)
-
-        pygame.display.update()
-        CLOCK.tick(FPS)
-        
-def adapt_list(lst):
-    """ Convert a list of numbers or booleans into string """
-    if type(lst[0]) == bool:
-        result = []
-        for itm in lst:
-            if itm:
-                result.append(1)
-            else:
-                result.append(0)        
-        return ",".join(str(num) for num in result)
-        
-    return  ",".join(str(num) for num in lst)
-
-def adapt_tuple(t):
-    """ Convert a tuple into a string """
-    return ",".join(str(num) for num in t)
         
 def convert_into_num_list(s):
     """ Convert a string into a list of numbers """
-    return map(int, s.split(","))
+    return [int(num) for num in s.split(",")]
 
 def convert_into_tuple(s):
     """ Convert a string into a tuple """
@@ -729,102 +1276,130 @@ def convert_into_bool(s):
     return result   
  
 def drop_data(connection, cursor):
-    """ Synthactic sugar: clear a series of tables from the db """
+    """ Synthactic sugar: clear the saved game, and the tables
+        of the old text format, from the db """
+    cursor.execute("DROP TABLE IF EXISTS saved_game")
+    cursor.execute("DROP TABLE IF EXISTS journal")
+    drop_old_data(cursor)
+    connection.commit()
+
+def drop_old_data(cursor):
+    """ Drop the six tables of the version 1 save format """
     cursor.execute("DROP TABLE IF EXISTS main_data")
     cursor.execute("DROP TABLE IF EXISTS minefield")
     cursor.execute("DROP TABLE IF EXISTS revealed")
     cursor.execute("DROP TABLE IF EXISTS mine_locs")
     cursor.execute("DROP TABLE IF EXISTS marked")
     cursor.execute("DROP TABLE IF EXISTS questions")
-   
-    connection.commit()
-    
-def retrieve_saved_data(con, cursor):
-    """ Access a database file and get the necessary data
-        to start a new game """
-    grid_data = {}
-    state_data = {}
-    
-    # get main game data
-    cursor.execute("SELECT * FROM main_data")
-    main_data = cursor.fetchone()    
-    grid_data['height'] = main_data[0]
-    grid_data['width'] = main_data[1]
-    grid_data['num_mines'] = main_data[2]
-    state_data['remaining'] = main_data[3]
-    state_data['timer'] = main_data[4]
-   
-    # get the minefield
+
+def create_save_table(cursor):
+    cursor.execute("CREATE TABLE IF NOT EXISTS saved_game(version INT, height INT, width INT, "
+                   "num_mines INT, seed INT, remaining INT, timer INT, mines BLOB, "
+                   "revealed BLOB, flags BLOB, questions BLOB)")
+
+def create_journal_table(cursor):
+    cursor.execute("CREATE TABLE IF NOT EXISTS journal(move TEXT, row INT, col INT, timer INT)")
+
+def save_game(con, cursor, minefield, params):
+    """ Store the game as a single saved_game row of packed bitmaps,
+        replacing any saved game, and commit; the saved_game table
+        must exist already """
+    height, width = minefield.get_height(), minefield.get_width()
+    mines, revealed = minefield.get_packed_state()
+    seed = minefield.get_seed()
+    if isinstance(seed, random.Random):
+        seed = None     # a random.Random instance cannot be stored
+    cursor.execute("DELETE FROM saved_game")
+    cursor.execute("INSERT INTO saved_game VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                   (SAVE_VERSION, height, width, minefield.get_num_mines(), seed,
+                    params.get_remaining_mines(), params.get_time(), lite.Binary(mines),
+                    lite.Binary(revealed),
+                    lite.Binary(engine.pack_cells(params.get_marked_fields(), height, width)),
+                    lite.Binary(engine.pack_cells(params.get_questions(), height, width))))
+    con.commit()
+
+def migrate_saved_data(con, cursor):
+    """ Convert a game saved in the six text tables of version 1
+        into a saved_game row, if there is one """
+    try:
+        cursor.execute("SELECT * FROM main_data")
+    except lite.Error:
+        return      # nothing saved in the old format
+    main_data = cursor.fetchone()
+    if main_data is None:
+        drop_old_data(cursor)
+        con.commit()
+        return
+    grid_data = {'height': main_data[0], 'width': main_data[1], 'num_mines': main_data[2]}
+    state_data = {'remaining': main_data[3], 'timer': main_data[4]}
     cursor.execute("SELECT * from minefield")
-    field = [convert_into_num_list(row[0]) for row in cursor.fetchall()]      
-    grid_data['minefield'] =  field
-    # get the revealed cells
+    grid_data['minefield'] = [convert_into_num_list(row[0]) for row in cursor.fetchall()]
     cursor.execute("SELECT * from revealed")
-    revealed = [convert_into_bool(row[0]) for row in cursor.fetchall()]        
-    grid_data['revealed'] = revealed
-    # get mine locations
+    grid_data['revealed'] = [convert_into_bool(row[0]) for row in cursor.fetchall()]
     cursor.execute("SELECT * from mine_locs")
-    locs = [convert_into_tuple(row[0]) for row in cursor.fetchall()]
-    grid_data['mine_locs'] = locs
-    # get marked cells
+    grid_data['mine_locs'] = [convert_into_tuple(row[0]) for row in cursor.fetchall()]
     cursor.execute("SELECT * from marked")
-    marked = [convert_into_tuple(row[0]) for row in cursor.fetchall()]
-    state_data['marked'] = marked
+    state_data['marked'] = [convert_into_tuple(row[0]) for row in cursor.fetchall()]
     cursor.execute("SELECT * from questions")
-    question = [convert_into_tuple(row[0]) for row in cursor.fetchall()]
-    state_data['questions'] = question
-    
-    # finished retrieving, drop the tables and close connection
-    drop_data(con, cursor)    
-    con.commit()
-    con.close()
-    return grid_data, state_data         
-      
+    state_data['questions'] = [convert_into_tuple(row[0]) for row in cursor.fetchall()]
+    drop_old_data(cursor)
+    create_save_table(cursor)
+    save_game(con, cursor, engine.Minefield(0, 0, 0, grid_data), engine.Game_parameters(0, state_data))
+
+def retrieve_saved_data(cursor):
+    """ Access a database file and get the necessary data to start
+        a new game; return None if there is no saved game we can read """
+    try:
+        cursor.execute("SELECT * FROM saved_game WHERE version=?", (SAVE_VERSION,))
+    except lite.Error:
+        return None
+    saved = cursor.fetchone()
+    if saved is None:
+        return None
+    (version, height, width, num_mines, seed, remaining, timer,
+     mines, revealed, flags, questions) = saved
+    grid_data = {'height': height, 'width': width, 'num_mines': num_mines, 'seed': seed,
+                 'mine_bitmap': mines, 'revealed_bitmap': revealed}
+    state_data = {'remaining': remaining, 'timer': timer,
+                  'marked': engine.unpack_cells(flags, height, width),
+                  'questions': engine.unpack_cells(questions, height, width)}
+    return grid_data, state_data
+
+def retrieve_journal(cursor):
+    """ Return the moves journaled since the saved game's snapshot """
+    try:
+        cursor.execute("SELECT move, row, col, timer FROM journal ORDER BY rowid")
+    except lite.Error:
+        return []
+    return cursor.fetchall()
+
 def terminate(save=False):
     """ Terminate the program. Save data to db as necessary """
-    con = lite.connect("mines_data.db")
-    cur = con.cursor()
-    
     if save:       
         # the game is in progress; save game data so that
-        # it can be resumed later; First create the tables:
-        cur.execute("DROP TABLE IF EXISTS main_data")
-        cur.execute("DROP TABLE IF EXISTS minefield")
-        cur.execute("DROP TABLE IF EXISTS revealed")
-        cur.execute("DROP TABLE IF EXISTS mine_locs")
-        cur.execute("DROP TABLE IF EXISTS marked")
-        cur.execute("DROP TABLE IF EXISTS questions")
-        
-        cur.execute("CREATE TABLE main_data(height INT, width INT, num_mines INT, remaining INT, timer INT)")
-        cur.execute("CREATE TABLE minefield(row TEXT)")
-        cur.execute("CREATE TABLE revealed(row TEXT)")
-        cur.execute("CREATE TABLE mine_locs(tup TEXT)")
-        cur.execute("CREATE TABLE marked(tup TEXT)")
-        cur.execute("CREATE TABLE questions(tup TEXT)")
-        # populate tables one by one
-        cur.execute("INSERT INTO main_data VALUES(?, ?, ?, ?, ?)",
-                    (grid.get_height(), grid.get_width(), grid.get_num_mines(),
-                     state.get_remaining_mines(), state.get_time()))
-        for row in grid._minefield:
-            cur.execute("INSERT INTO minefield VALUES(?)", (adapt_list(row),))
-
-        for row in grid._revealed:
-            cur.execute("INSERT INTO revealed VALUES(?)", (adapt_list(row),))
-
-        for tup in grid._mine_locs:
-            cur.execute("INSERT INTO mine_locs VALUES(?)", (adapt_tuple(tup),))
-
-        for tup in state._marked_fields:
-            cur.execute("INSERT INTO marked VALUES(?)", (adapt_tuple(tup),))
-
-        for tup in state._questions:
-            cur.execute("INSERT INTO questions VALUES(?)", (adapt_tuple(tup),))
-            
-        con.commit()
-        con.close()
+        # it can be resumed later
+        JOURNAL.snapshot()
+    JOURNAL.finish(keep=save)
+    if DATABASE is not None:
+        DATABASE.close()
+    PROFILER.close()
         
+    GENERATOR.close()
     pygame.quit()
     sys.exit()    
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="A remake of the classic Minesweeper game")
+    parser.add_argument('--replay', help="play this replay file back instead of a game")
+    parser.add_argument('--profile-csv', help="write the timing of every frame to this CSV file")
+    parser.add_argument('--watch', nargs=2, metavar=('ADDRESS', 'SESSION'),
+                        help="watch a session of a game server (see server.py)")
+    args = parser.parse_args()
+    if args.profile_csv:
+        PROFILER.stream_to(args.profile_csv)
+    if args.replay:
+        watch_replay(args.replay)
+    elif args.watch:
+        watch_session(args.watch[0], int(args.watch[1]))
+    else:
+        main()
@@ -0,0 +1,100 @@
+"""
+Frame profiling: where the time of every frame of the game loop goes.
+
+The loop calls lap(phase) at the end of each of its phases and end_frame()
+at the end of the frame. The time of every phase over the last frames is
+kept for percentiles, and every frame can be streamed to a CSV file, one
+row per frame with a column per phase. Disabled, lap and end_frame do
+nothing at all, so the instrumented code pays no more than an empty call.
+"""
+
+import timeit
+from collections import deque
+
+PROFILE_WINDOW = 300    # frames kept for the percentiles
+
+def ignore(*args):
+    """ Stands in for lap and end_frame while profiling is off """
+    pass
+
+def percentile(ordered, fraction):
+    """ Return the value below which the given fraction of the sorted values lie """
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class Profiler():
+    """ Lap timer of the phases of the frames of a game loop """
+    def __init__(self, phases, window=PROFILE_WINDOW, clock=timeit.default_timer):
+        self._phases = tuple(phases)
+        self._clock = clock
+        # seconds per phase over the last frames that went through the phase
+        self._samples = dict((phase, deque(maxlen=window)) for phase in self._phases)
+        self._frames = deque(maxlen=window)     # seconds per frame
+        self._current = {}      # phase -> seconds in the frame under way
+        self._last = 0          # time of the last lap
+        self._frame_start = 0
+        self._start = 0
+        self._count = 0         # frames profiled
+        self._csv = None
+        self._enabled = False
+        self.lap = ignore
+        self.end_frame = ignore
+
+    def enable(self):
+        if not self._enabled:
+            self._enabled = True
+            self._start = self._last = self._frame_start = self._clock()
+            self._current = {}
+            self.lap = self._lap
+            self.end_frame = self._end_frame
+
+    def disable(self):
+        """ Stop profiling, unless frames are being streamed to a file """
+        if self._enabled and self._csv is None:
+            self._enabled = False
+            self.lap = ignore
+            self.end_frame = ignore
+
+    def stream_to(self, path):
+        """ Profile every frame from now on and append it to a CSV file """
+        self._csv = open(path, 'w')
+        self._csv.write(",".join(("frame", "start_s", "frame_ms") + self._phases) + "\n")
+        self.enable()
+
+    def close(self):
+        if self._csv is not None:
+            self._csv.close()
+            self._csv = None
+
+    def _lap(self, phase):
+        now = self._clock()
+        self._current[phase] = self._current.get(phase, 0) + now - self._last
+        self._last = now
+
+    def _end_frame(self):
+        now = self._clock()
+        current = self._current
+        for phase, seconds in current.items():
+            self._samples[phase].append(seconds)
+        self._frames.append(now - self._frame_start)
+        self._count += 1
+        if self._csv is not None:
+            self._csv.write("%d,%.6f,%.3f," % (self._count, self._frame_start - self._start,
+                                               1000 * (now - self._frame_start)))
+            self._csv.write(",".join("%.3f" % (1000 * current[phase]) if phase in current else ""
+                                     for phase in self._phases) + "\n")
+        self._current = {}
+        self._frame_start = self._last = now
+
+    def get_fps(self):
+        """ Return the frames per second over the last frames """
+        total = sum(self._frames)
+        return len(self._frames) / total if total else 0.0
+
+    def get_stats(self):
+        """ Return (phase, p50 ms, p99 ms) for the phases seen in the last frames """
+        stats = []
+        for phase in self._phases:
+            if self._samples[phase]:
+                ordered = sorted(self._samples[phase])
+                stats.append((phase, 1000 * percentile(ordered, 0.5), 1000 * percentile(ordered, 0.99)))
+        return stats
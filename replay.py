@@ -0,0 +1,169 @@
+"""
+Recording and playback of Minesweeper games.
+
+A replay file holds the board of a game (size, seed, safe zone), its moves
+with their times, and a digest of the final position. Replaying the moves
+on a board dealt from the same seed must end in the same position, which
+makes replays handy to reproduce bugs and to check engine changes. The
+game saves a replay of every finished game in its replays directory; to
+check a batch of them headless, as fast as the engine goes:
+
+    python replay.py replays/*.replay
+
+and to watch one in real time:
+
+    python minesweeper.py --replay replays/20240101-120000.replay
+"""
+
+import argparse, gzip, hashlib, json, multiprocessing, random, sys, time
+import engine
+
+REPLAY_VERSION = 1
+# The GameEngine methods a replay can hold; moves are stored by their index
+MOVES = ('reveal', 'toggle_flag', 'flag', 'clear_mark', 'chord')
+
+def digest(game):
+    """ Return a hex digest of the position of a game: its state, mines,
+        revealed cells and marks (not its clock) """
+    minefield = game.get_minefield()
+    params = game.get_params()
+    height, width = minefield.get_height(), minefield.get_width()
+    mines, revealed = minefield.get_packed_state()
+    sha = hashlib.sha1(game.get_state().encode('ascii'))
+    for data in (mines, revealed, engine.pack_cells(params.get_marked_fields(), height, width),
+                 engine.pack_cells(params.get_questions(), height, width)):
+        sha.update(data)
+    return sha.hexdigest()
+
+class Recorder():
+    """ Records every game started on a GameEngine. Games continued with
+        load_game are not recorded, since the board they were dealt from
+        is not known. """
+    def __init__(self, game, clock=time.time):
+        self._game = game
+        self._clock = clock
+        self._moves = None      # [milliseconds since the previous move, move, row, col]
+        self._start = 0
+        self._elapsed = 0       # milliseconds from new_game to the last move
+        game.add_listener(self.on_change)
+        game.add_move_listener(self.record)
+
+    def on_change(self, changed):
+        if changed is None:
+            if self._game.get_state() == engine.READY:
+                self._moves = []
+                self._start = self._clock()
+                self._elapsed = 0
+            else:
+                self._moves = None
+
+    def record(self, move, cell):
+        """ Move listener: append a move to the recording """
+        if self._moves is None:
+            return
+        elapsed = int(round(1000 * (self._clock() - self._start)))
+        self._moves.append([elapsed - self._elapsed, MOVES.index(move), cell[0], cell[1]])
+        self._elapsed = elapsed
+
+    def get_replay(self):
+        """ Return the recording of the current game, or None if it is not
+            recorded or has no moves yet """
+        if not self._moves:
+            return None
+        minefield = self._game.get_minefield()
+        if isinstance(minefield.get_seed(), random.Random):
+            return None     # the board cannot be dealt again
+        return {'version': REPLAY_VERSION,
+                'height': minefield.get_height(),
+                'width': minefield.get_width(),
+                'mines': minefield.get_num_mines(),
+                'seed': minefield.get_seed(),
+                'safe_zone': minefield.get_safe_zone(),
+                'chunked': isinstance(minefield, engine.ChunkedMinefield),
+                'moves': self._moves,
+                'digest': digest(self._game)}
+
+    def save(self, path):
+        """ Write the recording of the current game to path; return
+            False if there is nothing to write """
+        replay = self.get_replay()
+        if replay is None:
+            return False
+        dump(replay, path)
+        return True
+
+def dump(replay, path):
+    with gzip.open(path, 'wb') as output:
+        output.write(json.dumps(replay, separators=(',', ':')).encode('utf-8'))
+
+def load(path):
+    with gzip.open(path, 'rb') as source:
+        replay = json.loads(source.read().decode('utf-8'))
+    if replay.get('version') != REPLAY_VERSION:
+        raise ValueError(path + " is not a version " + str(REPLAY_VERSION) + " replay")
+    return replay
+
+def start(game, replay):
+    """ Deal the board of a replay on a GameEngine """
+    return game.new_game(replay['height'], replay['width'], replay['mines'], seed=replay['seed'],
+                         safe_zone=replay['safe_zone'], chunked=replay['chunked'])
+
+def get_moves(replay):
+    """ Yield the (seconds since the start, move, cell) of a replay """
+    elapsed = 0
+    for delay, move, row, col in replay['moves']:
+        elapsed += delay
+        yield elapsed / 1000.0, MOVES[move], (row, col)
+
+def play(replay, game=None):
+    """ Play a replay at full speed; return the GameEngine """
+    if game is None:
+        game = engine.GameEngine()
+    start(game, replay)
+    for elapsed, move, cell in get_moves(replay):
+        getattr(game, move)(cell)
+    return game
+
+def verify(replay):
+    """ Return True if playing the replay ends in its recorded position """
+    return digest(play(replay)) == replay['digest']
+
+def verify_file(path):
+    """ Worker entry point: return the path, whether the replay checks
+        out (None if it cannot be read) and its number of moves """
+    try:
+        replay = load(path)
+    except (IOError, ValueError, KeyError):
+        return path, None, 0
+    return path, verify(replay), len(replay['moves'])
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that replays end in their recorded positions")
+    parser.add_argument('paths', nargs='+', help="replay files")
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    processes = args.processes or multiprocessing.cpu_count()
+    start_time = time.time()
+    if processes == 1 or len(args.paths) == 1:
+        results = [verify_file(path) for path in args.paths]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(verify_file, args.paths, chunksize=max(1, len(args.paths) // (processes * 4)))
+        finally:
+            pool.close()
+            pool.join()
+    failures = 0
+    for path, ok, moves in results:
+        if ok is None:
+            print("unreadable: " + path)
+        elif not ok:
+            print("mismatch:   " + path)
+        failures += not ok
+    print("%d replays, %d moves, %d failed in %.2f s" % (len(results), sum(result[2] for result in results),
+                                                         failures, time.time() - start_time))
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
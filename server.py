@@ -0,0 +1,261 @@
+"""
+A game server hosting many Minesweeper sessions in one process.
+
+Clients talk to it over TCP or a Unix socket, one JSON object per line.
+A player opens a session with {"op": "new", "height": 9, "width": 9,
+"mines": 10} and plays it with moves such as {"op": "reveal", "cell":
+[row, col]}; the other moves are those of replay.MOVES. Every move is
+answered with the delta of the cells it changed, never the whole board:
+
+    {"op": "delta", "cells": [[row, col, value], ...], "state": "playing", ...}
+
+value being the number of a revealed cell (9 for a mine), "flag",
+"question" or null for a covered cell. Spectators send {"op": "watch",
+"session": id}; they get the whole board once ({"op": "board", ...}), then
+the same deltas as the player, each encoded once for all of them, and the
+new board whenever the player starts another game. A spectator that does
+not keep up is dropped rather than buffered for.
+
+The server needs Python 3.7 or newer:
+
+    python server.py --listen 127.0.0.1:8765
+    python server.py --listen /tmp/mines.sock
+
+loadgen.py measures how many sessions it keeps up with.
+"""
+
+import argparse, asyncio, itertools, json, os, sys, time
+import engine, replay
+
+try:
+    import resource
+except ImportError:     # not on Windows
+    resource = None
+
+MAX_LINE = 4096                 # longest request line accepted
+MAX_CELLS = 10000               # largest board a session may have
+MAX_SPECTATOR_BUFFER = 65536    # bytes queued for a spectator before it is dropped
+BACKLOG = 1024                  # connections waiting to be accepted
+
+def parse_address(text):
+    """ Return ('tcp', (host, port)) for 'HOST:PORT', else ('unix', path) """
+    host, _, port = text.rpartition(':')
+    if host and port.isdigit():
+        return 'tcp', (host, int(port))
+    return 'unix', text
+
+def raise_file_limit():
+    """ Allow as many open sockets as the system lets this process have """
+    if resource is not None:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+async def open_connection(address, limit=MAX_LINE):
+    """ Connect to a server at an address of parse_address """
+    kind, where = parse_address(address)
+    if kind == 'tcp':
+        return await asyncio.open_connection(where[0], where[1], limit=limit)
+    return await asyncio.open_unix_connection(where, limit=limit)
+
+def encode(message):
+    return json.dumps(message, separators=(',', ':')).encode('utf-8') + b'\n'
+
+def get_view(game, cell):
+    """ Return what a client sees of a cell: its number if revealed,
+        'flag', 'question' or None """
+    minefield = game.get_minefield()
+    if minefield.is_revealed(cell[0], cell[1]):
+        return int(minefield.get_cell(cell[0], cell[1]))
+    if game.is_flagged(cell):
+        return 'flag'
+    if game.get_params().is_question(cell):
+        return 'question'
+    return None
+
+class Session():
+    """ A game on the server: its GameEngine, which holds the Minefield and
+        the Game_parameters, and the writers of the spectators """
+    def __init__(self, session_id):
+        self.id = session_id
+        self.game = engine.GameEngine()
+        self.spectators = set()
+
+    def get_board(self):
+        """ Return the board message: the size, and every cell not covered """
+        game = self.game
+        minefield = game.get_minefield()
+        params = game.get_params()
+        cells = []
+        for row, revealed in enumerate(minefield.get_revealed()):
+            for col, is_revealed in enumerate(revealed):
+                if is_revealed:
+                    cells.append([row, col, int(minefield.get_cell(row, col))])
+        cells.extend([row, col, 'flag'] for row, col in params.get_marked_fields())
+        cells.extend([row, col, 'question'] for row, col in params.get_questions())
+        message = self.get_delta(cells)
+        message.update({'op': 'board', 'session': self.id, 'height': minefield.get_height(),
+                        'width': minefield.get_width(), 'mines': minefield.get_num_mines()})
+        return message
+
+    def get_delta(self, cells):
+        status = self.game.status()
+        return {'op': 'delta', 'cells': cells, 'state': status['state'], 'moves': status['moves'],
+                'time': status['time'], 'remaining_mines': status['remaining_mines']}
+
+    def play(self, move, cell):
+        """ Play a move; return the delta message of the cells it changed """
+        changed = getattr(self.game, move)(cell)
+        return self.get_delta([[row, col, get_view(self.game, (row, col))] for row, col in changed])
+
+class Server():
+    """ Serves sessions to the clients connected to it """
+    def __init__(self, max_cells=MAX_CELLS):
+        self._max_cells = max_cells
+        self._sessions = {}
+        self._ids = itertools.count(1)
+        self._clients = 0
+        self._moves = 0
+
+    async def handle(self, reader, writer):
+        """ Serve one connection until it closes. A connection plays one
+            session, game after game, and the session ends with it. """
+        self._clients += 1
+        session = None
+        watched = None
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:      # longer than MAX_LINE
+                    break
+                if not line:
+                    break
+                changed = None      # the session whose spectators get the reply too
+                try:
+                    request = json.loads(line.decode('utf-8'))
+                    op = request['op']
+                    if op == 'new':
+                        session = self._deal(request, session)
+                        reply = session.get_board()
+                        changed = session
+                    elif op in replay.MOVES:
+                        if session is None:
+                            raise ValueError("no session; send 'new' first")
+                        cell = (int(request['cell'][0]), int(request['cell'][1]))
+                        minefield = session.game.get_minefield()
+                        if not (0 <= cell[0] < minefield.get_height() and 0 <= cell[1] < minefield.get_width()):
+                            raise ValueError("cell outside the board")
+                        reply = session.play(op, cell)
+                        self._moves += 1
+                        if reply['cells']:
+                            changed = session
+                    elif op == 'watch':
+                        if watched is not None:
+                            watched.spectators.discard(writer)
+                        watched = self._sessions.get(request['session'])
+                        if watched is None:
+                            raise ValueError("no such session")
+                        watched.spectators.add(writer)
+                        reply = watched.get_board()
+                    elif op == 'stats':
+                        reply = self.get_stats()
+                    else:
+                        raise ValueError("unknown op " + repr(op))
+                except (ValueError, KeyError, TypeError, IndexError) as error:
+                    reply = {'op': 'error', 'message': str(error)}
+                data = encode(reply)
+                if changed is not None:
+                    self._broadcast(changed, data)
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._clients -= 1
+            if session is not None:
+                self._close(session)
+            if watched is not None:
+                watched.spectators.discard(writer)
+            writer.close()
+
+    def _deal(self, request, session):
+        """ Start the game a 'new' request asks for, in a new session if
+            session is None; return the session """
+        height, width, num_mines = int(request['height']), int(request['width']), int(request['mines'])
+        if height < 1 or width < 1 or height * width > self._max_cells:
+            raise ValueError("boards have 1 to %d cells" % self._max_cells)
+        if not 0 < num_mines < height * width:
+            raise ValueError("a board needs at least one mine and one safe cell")
+        if session is None:
+            session = Session(next(self._ids))
+            self._sessions[session.id] = session
+        session.game.new_game(height, width, num_mines, seed=request.get('seed'))
+        return session
+
+    def _close(self, session):
+        del self._sessions[session.id]
+        self._broadcast(session, encode({'op': 'closed', 'session': session.id}))
+        session.spectators.clear()
+
+    def _broadcast(self, session, data):
+        """ Send the encoded message to the spectators of a session """
+        for spectator in list(session.spectators):
+            if spectator.transport.get_write_buffer_size() > MAX_SPECTATOR_BUFFER:
+                session.spectators.discard(spectator)
+                spectator.close()
+            else:
+                spectator.write(data)
+
+    async def tick(self):
+        """ Run the clocks of all games, once a second """
+        while True:
+            await asyncio.sleep(1)
+            for session in self._sessions.values():
+                session.game.tick()
+
+    def get_stats(self):
+        return {'op': 'stats', 'sessions': len(self._sessions), 'clients': self._clients,
+                'spectators': sum(len(session.spectators) for session in self._sessions.values()),
+                'moves': self._moves, 'cpu': time.process_time(),
+                # the peak resident size; kilobytes on Linux
+                'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None}
+
+async def serve(address, max_cells=MAX_CELLS, ready=None):
+    """ Run a server at an address of parse_address until cancelled """
+    server = Server(max_cells)
+    kind, where = parse_address(address)
+    if kind == 'tcp':
+        listener = await asyncio.start_server(server.handle, where[0], where[1], limit=MAX_LINE,
+                                              backlog=BACKLOG)
+    else:
+        if os.path.exists(where):
+            os.remove(where)
+        listener = await asyncio.start_unix_server(server.handle, where, limit=MAX_LINE, backlog=BACKLOG)
+    clock = asyncio.ensure_future(server.tick())
+    if ready is not None:
+        ready()
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        clock.cancel()
+
+def main():
+    parser = argparse.ArgumentParser(description="Host Minesweeper sessions for clients over a socket")
+    parser.add_argument('--listen', default='127.0.0.1:8765', help="HOST:PORT, or the path of a Unix socket")
+    parser.add_argument('--max-cells', type=int, default=MAX_CELLS, help="largest board a session may have")
+    args = parser.parse_args()
+
+    raise_file_limit()
+
+    def ready():
+        print("listening on " + args.listen)
+        sys.stdout.flush()
+    try:
+        asyncio.run(serve(args.listen, args.max_cells, ready))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
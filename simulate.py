@@ -0,0 +1,234 @@
+"""
+Monte Carlo simulation of Minesweeper games played by a bot.
+
+Plays many seeded games per board size across a process pool and prints
+the win rate, moves, guesses and board difficulty (3BV) of each size.
+Every run is reproducible from its master seed, whatever the number of
+processes. Example:
+
+    python simulate.py --games 10000 --strategy single --csv results.csv
+"""
+
+import argparse, csv, inspect, json, multiprocessing, random, time
+import engine, solver
+
+# Fields of the per-game records returned by the workers
+RECORD_FIELDS = ('height', 'width', 'mines', 'seed', 'won', 'moves', 'guesses', '3bv', 'seconds')
+REVEAL = 'reveal'
+FLAG = 'flag'
+
+# ------------------------ Strategies ------------------------------------------ #
+# A strategy is called as strategy(game, rng) with a GameEngine whose game is
+# in progress, and returns a non-empty list of (action, cell, is_guess) moves,
+# action being REVEAL or FLAG. Moves are played in order until the game ends.
+# A strategy may also be a class; a new instance is then made for every game.
+
+def covered_cells(game):
+    """ Return the covered cells of the game that are not flagged """
+    minefield = game.get_minefield()
+    return [(row, col) for row in range(minefield.get_height())
+            for col in range(minefield.get_width())
+            if not minefield.is_revealed(row, col) and not game.is_flagged((row, col))]
+
+def first_move(game):
+    """ Open in the middle of the board; the first click never hits a mine """
+    minefield = game.get_minefield()
+    return [(REVEAL, (minefield.get_height() // 2, minefield.get_width() // 2), False)]
+
+def random_strategy(game, rng):
+    """ Reveal a random covered cell """
+    if game.status()['state'] == engine.READY:
+        return first_move(game)
+    return [(REVEAL, rng.choice(covered_cells(game)), True)]
+
+def single_point_strategy(game, rng):
+    """ Reveal the covered neighbors of numbers that have all their mines
+        flagged, flag those of numbers with as many covered neighbors as
+        mines. Guess a random covered cell when neither rule applies. """
+    if game.status()['state'] == engine.READY:
+        return first_move(game)
+    minefield = game.get_minefield()
+    safe = set()
+    mines = set()
+    for row in range(minefield.get_height()):
+        for col in range(minefield.get_width()):
+            if not minefield.is_revealed(row, col):
+                continue
+            number = minefield.get_cell(row, col)
+            covered = [neighbor for neighbor in minefield.get_neighbors(row, col)
+                       if not minefield.is_revealed(neighbor[0], neighbor[1])]
+            flagged = [neighbor for neighbor in covered if game.is_flagged(neighbor)]
+            if len(flagged) == len(covered):
+                continue
+            if number == len(flagged):
+                safe.update(neighbor for neighbor in covered if neighbor not in flagged)
+            elif number == len(covered):
+                mines.update(neighbor for neighbor in covered if neighbor not in flagged)
+    if safe or mines:
+        return [(REVEAL, cell, False) for cell in sorted(safe)] + \
+               [(FLAG, cell, False) for cell in sorted(mines)]
+    return [(REVEAL, rng.choice(covered_cells(game)), True)]
+
+STRATEGIES = {'random': random_strategy,
+              'single': single_point_strategy,
+              'solver': solver.Solver_strategy}
+
+def get_strategy(name):
+    """ Return a strategy by its name in STRATEGIES, or by a
+        'module:function' path for strategies defined elsewhere """
+    if name in STRATEGIES:
+        return STRATEGIES[name]
+    module_name, _, function_name = name.partition(':')
+    module = __import__(module_name, fromlist=[function_name])
+    return getattr(module, function_name)
+
+# ------------------------ Playing games --------------------------------------- #
+def play_game(height, width, num_mines, seed, strategy):
+    """ Play one game with a strategy function; return its record """
+    if inspect.isclass(strategy):
+        strategy = strategy()
+    rng = random.Random(seed + 2 ** 32)    # board seeds are below 2 ** 32, keep the streams apart
+    game = engine.GameEngine()
+    game.new_game(height, width, num_mines, seed=seed)
+    moves = 0
+    guesses = 0
+    start = time.time()
+    while not game.is_over():
+        for action, cell, is_guess in strategy(game, rng):
+            if game.is_over():
+                break
+            if action == REVEAL:
+                game.reveal(cell)
+            elif not game.is_flagged(cell):
+                game.toggle_flag(cell)
+            moves += 1
+            guesses += is_guess
+    seconds = time.time() - start
+    return (height, width, num_mines, seed, int(game.status()['state'] == engine.WON),
+            moves, guesses, game.get_minefield().get_3bv(), seconds)
+
+def play_batch(task):
+    """ Worker entry point: play a list of seeded games of one board size """
+    height, width, num_mines, seeds, strategy_name = task
+    strategy = get_strategy(strategy_name)
+    return [play_game(height, width, num_mines, seed, strategy) for seed in seeds]
+
+def get_seeds(master_seed, config_index, games):
+    """ Derive the game seeds of a board size from the master seed """
+    rng = random.Random(master_seed * 1000003 + config_index)
+    return [rng.randrange(2 ** 32) for game in range(games)]
+
+def run(configs, games, master_seed=0, strategy_name='single', processes=None, batch_size=None):
+    """ Play games games for every (height, width, mines) in configs across
+        a process pool; return the records in a reproducible order """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if batch_size is None:
+        # a few batches per process keeps the workers evenly loaded
+        batch_size = max(1, min(200, games // (processes * 4)))
+    tasks = []
+    for index, (height, width, num_mines) in enumerate(configs):
+        seeds = get_seeds(master_seed, index, games)
+        for start in range(0, games, batch_size):
+            tasks.append((height, width, num_mines, seeds[start:start + batch_size], strategy_name))
+
+    records = []
+    if processes == 1:
+        for task in tasks:
+            records.extend(play_batch(task))
+        return records
+    pool = multiprocessing.Pool(processes)
+    try:
+        for batch in pool.imap(play_batch, tasks):
+            records.extend(batch)
+    finally:
+        pool.close()
+        pool.join()
+    return records
+
+# ------------------------ Reporting ------------------------------------------- #
+def summarize(records):
+    """ Return one summary row per board size, in order of appearance """
+    rows = []
+    groups = {}
+    for record in records:
+        key = record[:3]
+        if key not in groups:
+            groups[key] = []
+            rows.append(key)
+        groups[key].append(record)
+    summary = []
+    for key in rows:
+        group = groups[key]
+        count = float(len(group))
+        wins = [record for record in group if record[4]]
+        summary.append({'size': engine.get_size_name(key[0], key[1], key[2]),
+                        'games': len(group),
+                        'win_rate': len(wins) / count,
+                        'moves': sum(record[5] for record in group) / count,
+                        'guesses': sum(record[6] for record in group) / count,
+                        '3bv': sum(record[7] for record in group) / count,
+                        'ms_per_win': 1000 * sum(record[8] for record in wins) / len(wins) if wins else 0.0})
+    return summary
+
+def format_summary(summary):
+    """ Return the summary as a text table """
+    lines = ["%-16s %8s %8s %8s %8s %8s %11s" % ('size', 'games', 'win %', 'moves',
+                                                'guesses', '3BV', 'ms per win')]
+    for row in summary:
+        lines.append("%-16s %8d %8.2f %8.1f %8.2f %8.1f %11.2f" % (
+            row['size'], row['games'], 100 * row['win_rate'], row['moves'],
+            row['guesses'], row['3bv'], row['ms_per_win']))
+    return "\n".join(lines)
+
+def write_csv(records, path):
+    """ Dump the records one row per game """
+    with open(path, 'w') as output:
+        writer = csv.writer(output)
+        writer.writerow(RECORD_FIELDS)
+        writer.writerows(records)
+
+def write_columns(records, path):
+    """ Dump the records column by column as JSON, one list per field """
+    columns = dict((field, [record[index] for record in records])
+                   for index, field in enumerate(RECORD_FIELDS))
+    with open(path, 'w') as output:
+        json.dump(columns, output)
+
+def parse_config(text):
+    """ Parse 'small', 'medium', 'large', 'HxW/MINES' or 'HxW@DENSITY' """
+    if text in engine.NEW_GAME_REFERENCE:
+        return tuple(engine.NEW_GAME_REFERENCE[text])
+    if '@' in text:
+        dimensions, density = text.split('@')
+        height, width = [int(num) for num in dimensions.split('x')]
+        return (height, width, max(1, int(round(height * width * float(density)))))
+    dimensions, mines = text.split('/')
+    height, width = [int(num) for num in dimensions.split('x')]
+    return (height, width, int(mines))
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate Minesweeper games played by a bot")
+    parser.add_argument('sizes', nargs='*', default=['small', 'medium', 'large'],
+                        help="small, medium, large, HxW/MINES or HxW@DENSITY")
+    parser.add_argument('--games', type=int, default=1000, help="games per size")
+    parser.add_argument('--seed', type=int, default=0, help="master seed")
+    parser.add_argument('--strategy', default='single',
+                        help="one of " + ", ".join(sorted(STRATEGIES)) + " or module:function")
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--csv', help="write per-game records to this CSV file")
+    parser.add_argument('--columns', help="write per-game records column-wise to this JSON file")
+    args = parser.parse_args()
+
+    start = time.time()
+    records = run([parse_config(size) for size in args.sizes], args.games, args.seed,
+                  args.strategy, args.processes)
+    print(format_summary(summarize(records)))
+    print("%d games in %.2f s" % (len(records), time.time() - start))
+    if args.csv:
+        write_csv(records, args.csv)
+    if args.columns:
+        write_columns(records, args.columns)
+
+if __name__ == '__main__':
+    main()
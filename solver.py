@@ -0,0 +1,468 @@
+"""
+A constraint-propagation Minesweeper solver.
+
+Every revealed number is a constraint: its covered neighbors hold exactly
+that many mines. The Solver applies the single-cell rules (no mines left,
+or as many mines as covered cells) and the pairwise subset/superset rules
+between overlapping constraints. It listens to a GameEngine and only
+re-examines the constraints touched by each move, so it keeps up on very
+large boards. When nothing can be deduced, it computes the mine probability
+of every covered cell and guesses the safest one.
+"""
+
+from __future__ import division
+import math, random
+from collections import deque
+import engine
+
+REVEAL = 'reveal'
+FLAG = 'flag'
+RANDOM_PROBES = 64      # random picks tried before scanning the board for a covered cell
+ENUMERATION_BUDGET = 20000  # search states per frontier component before estimating it instead
+MAX_COMPONENT_CLASSES = 400 # bigger components are estimated too; this bounds the recursion
+
+# ------------------------ Mine probabilities ---------------------------------- #
+# The covered cells next to numbers (the frontier) split into components that
+# share no number. The mine layouts of each component are counted on their own,
+# by the number of mines they use; the components are then tied together by the
+# number of mines left for the other covered cells (the interior), each way of
+# placing those being equally likely.
+
+def log_binomial(n, k):
+    """ Return the logarithm of n choose k, or None if it is zero """
+    if k < 0 or k > n:
+        return None
+    return math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1)
+
+def split_components(constraints):
+    """ Group (cells, mines) constraints into components sharing no cell;
+        return a list of frozensets of constraints """
+    owner = {}          # cell -> index of its group
+    groups = []
+    for constraint in constraints:
+        merged = set(owner[cell] for cell in constraint[0] if cell in owner)
+        if not merged:
+            owner.update((cell, len(groups)) for cell in constraint[0])
+            groups.append([constraint])
+            continue
+        target = min(merged)
+        for index in merged - set([target]):
+            for other in groups[index]:
+                owner.update((cell, target) for cell in other[0])
+            groups[target].extend(groups[index])
+            groups[index] = []
+        owner.update((cell, target) for cell in constraint[0])
+        groups[target].append(constraint)
+    return [frozenset(group) for group in groups if group]
+
+def binomial(n, k):
+    """ Return n choose k for small n """
+    result = 1
+    for index in range(k):
+        result = result * (n - index) // (index + 1)
+    return result
+
+def count_layouts(component, budget=ENUMERATION_BUDGET):
+    """ Count the mine layouts that satisfy a component's constraints.
+        Return its cells and a dict {mines: (layouts, mine count per cell)},
+        or None if it is too big to count. """
+    constraints = list(component)
+    touching = {}
+    for index, (cells, mines) in enumerate(constraints):
+        for cell in cells:
+            touching.setdefault(cell, []).append(index)
+    # cells next to the same numbers are interchangeable; only how many of
+    # them are mines matters. Visit those classes breadth first, so that
+    # constraints are completed early.
+    classes = {}
+    for cell, indices in touching.items():
+        classes.setdefault(tuple(indices), []).append(cell)
+    start = min(touching)
+    order = [tuple(touching[start])]
+    seen = set(order)
+    position = 0
+    while position < len(order):
+        for index in order[position]:
+            for cell in sorted(constraints[index][0]):
+                key = tuple(touching[cell])
+                if key not in seen:
+                    seen.add(key)
+                    order.append(key)
+        position += 1
+    if len(order) > MAX_COMPONENT_CLASSES:
+        return None
+    sizes = [len(classes[key]) for key in order]
+    # the constraints still open when the search reaches a class; with the
+    # mines they still need, they are all that the rest of the search depends on
+    first = {}
+    last = {}
+    for position, key in enumerate(order):
+        for index in key:
+            first.setdefault(index, position)
+            last[index] = position
+    spanning = [[index for index in first if first[index] < position <= last[index]]
+                for position in range(len(order))]
+    need = [mines for cells, mines in constraints]     # mines still to place
+    free = [len(cells) for cells, mines in constraints] # cells still to decide
+    known = {}
+    steps = [0]
+
+    def search(position):
+        """ Return {mines: [layouts, mine count per class]} for the classes
+            from position on, or None when over budget """
+        if position == len(order):
+            return {0: [1, []]}
+        state = (position, tuple(need[index] for index in spanning[position]))
+        if state in known:
+            return known[state]
+        steps[0] += 1
+        if steps[0] > budget:
+            return None
+        touched = order[position]
+        size = sizes[position]
+        for index in touched:
+            free[index] -= size
+        low = max(0, max(need[index] - free[index] for index in touched))
+        high = min(size, min(need[index] for index in touched))
+        result = {}
+        for count in range(low, high + 1):
+            for index in touched:
+                need[index] -= count
+            rest = search(position + 1)
+            for index in touched:
+                need[index] += count
+            if rest is None:
+                result = None
+                break
+            ways = binomial(size, count)
+            for mines, (rest_layouts, rest_counts) in rest.items():
+                layouts = ways * rest_layouts
+                counts = [count * layouts] + [ways * value for value in rest_counts]
+                entry = result.get(mines + count)
+                if entry is None:
+                    result[mines + count] = [layouts, counts]
+                else:
+                    entry[0] += layouts
+                    entry[1] = [a + b for a, b in zip(entry[1], counts)]
+        for index in touched:
+            free[index] += size
+        known[state] = result
+        return result
+
+    layouts = search(0)
+    if layouts is None:
+        return None
+    cells = []
+    for key in order:
+        cells.extend(classes[key])
+    result = {}
+    for mines, (count, counts) in layouts.items():
+        per_cell = []
+        for size, class_count in zip(sizes, counts):
+            per_cell.extend([class_count / size] * size)
+        result[mines] = (count, per_cell)
+    return cells, result
+
+def convolve(first, second):
+    """ Combine two {mines: weight} distributions of independent components """
+    result = {}
+    for mines, weight in first.items():
+        for other_mines, other_weight in second.items():
+            total = mines + other_mines
+            result[total] = result.get(total, 0.0) + weight * other_weight
+    return result
+
+def combine_components(results, interior, mines_left):
+    """ Tie counted components together by the mines left for the interior
+        cells; return ({cell: probability}, interior probability) """
+    weights = []
+    for order, layouts in results:
+        # scaled to at most 1, so that the products below cannot overflow
+        largest = max(value[0] for value in layouts.values())
+        weights.append(dict((mines, value[0] / largest) for mines, value in layouts.items()))
+    prefix = [{0: 1.0}]
+    for weight in weights:
+        prefix.append(convolve(prefix[-1], weight))
+    suffix = [{0: 1.0}]
+    for weight in reversed(weights):
+        suffix.append(convolve(suffix[-1], weight))
+    suffix.reverse()
+
+    # the interior takes the rest of the mines; comb(interior, rest) ways each
+    logs = {}
+    for mines in prefix[-1]:
+        value = log_binomial(interior, mines_left - mines)
+        if value is not None:
+            logs[mines] = value
+    if not logs:
+        return {}, 0.0      # the known mines contradict the counter
+    top = max(logs.values())
+    interior_ways = dict((mines, math.exp(value - top)) for mines, value in logs.items())
+    total = sum(prefix[-1][mines] * ways for mines, ways in interior_ways.items())
+    interior_mines = sum(prefix[-1][mines] * ways * (mines_left - mines)
+                         for mines, ways in interior_ways.items())
+
+    probabilities = {}
+    for index, (order, layouts) in enumerate(results):
+        rest = convolve(prefix[index], suffix[index + 1])
+        largest = max(value[0] for value in layouts.values())
+        chances = [0.0] * len(order)
+        for mines, (count, counts) in layouts.items():
+            # how likely the rest of the board is, given this component holds mines mines
+            likelihood = sum(weight * interior_ways.get(mines + others, 0.0)
+                             for others, weight in rest.items()) / largest
+            for position, mine_count in enumerate(counts):
+                chances[position] += mine_count * likelihood
+        for cell, chance in zip(order, chances):
+            probabilities[cell] = chance / total
+    return probabilities, (interior_mines / total / interior if interior else 0.0)
+
+class Solver():
+    """ Deduces safe cells and mines of the game played by a GameEngine """
+    def __init__(self, game, rng=None):
+        self._game = game
+        self._rng = rng if rng is not None else random.Random()
+        self._minefield = None
+        game.add_listener(self.update)
+        if game.get_minefield() is not None:
+            self._reset()
+
+    def _reset(self):
+        """ Start over on the engine's current minefield. A game that is
+            already under way is read from the whole board once. """
+        self._minefield = self._game.get_minefield()
+        self._height = self._minefield.get_height()
+        self._width = self._minefield.get_width()
+        self._safe = set()          # covered cells proven to be safe
+        self._to_reveal = deque()   # the same, in the order they were found
+        self._mines = set()         # cells proven to be mines
+        self._to_flag = deque()
+        self._open = set()          # numbers that still have undecided neighbors
+        self._worklist = deque()    # numbers to re-examine
+        self._queued = set()
+        self._layouts = {}          # component -> count_layouts result
+        if self._game.get_state() != engine.READY:
+            for row in range(self._height):
+                for col in range(self._width):
+                    if self._minefield.is_revealed(row, col):
+                        self._queue((row, col))
+
+    def update(self, changed):
+        """ Engine listener: take the cells changed by a move into account """
+        if changed is None:
+            self._reset()           # a new game
+            return
+        for cell in changed:
+            if not self._minefield.is_revealed(cell[0], cell[1]):
+                continue            # only a mark changed
+            self._safe.discard(cell)
+            self._queue(cell)
+            # the neighboring numbers lost an undecided cell
+            for neighbor in self._minefield.get_neighbors(cell[0], cell[1]):
+                if self._minefield.is_revealed(neighbor[0], neighbor[1]):
+                    self._queue(neighbor)
+
+    def _queue(self, cell):
+        """ Put a revealed number on the worklist """
+        if cell in self._queued or self._minefield.get_cell(cell[0], cell[1]) in (0, 9):
+            return
+        self._queued.add(cell)
+        self._worklist.append(cell)
+        self._open.add(cell)
+
+    def _constraint(self, cell):
+        """ Return the undecided neighbors of a number and how many mines they hold """
+        count = self._minefield.get_cell(cell[0], cell[1])
+        unknown = []
+        for neighbor in self._minefield.get_neighbors(cell[0], cell[1]):
+            if self._minefield.is_revealed(neighbor[0], neighbor[1]) or neighbor in self._safe:
+                continue
+            if neighbor in self._mines:
+                count -= 1
+            else:
+                unknown.append(neighbor)
+        return frozenset(unknown), count
+
+    def _decide(self, cells, is_mine):
+        """ Record cells as mines or as safe and requeue the numbers around them """
+        for cell in cells:
+            if is_mine:
+                self._mines.add(cell)
+                self._to_flag.append(cell)
+            else:
+                self._safe.add(cell)
+                self._to_reveal.append(cell)
+            for neighbor in self._minefield.get_neighbors(cell[0], cell[1]):
+                if self._minefield.is_revealed(neighbor[0], neighbor[1]):
+                    self._queue(neighbor)
+
+    def _nearby_numbers(self, cell):
+        """ Return the open numbers whose neighborhoods may overlap cell's """
+        row, col = cell
+        return [(n_row, n_col)
+                for n_row in range(max(row - 2, 0), min(row + 3, self._height))
+                for n_col in range(max(col - 2, 0), min(col + 3, self._width))
+                if (n_row, n_col) != cell and (n_row, n_col) in self._open]
+
+    def deduce(self):
+        """ Work through the worklist until no rule applies any more """
+        while self._worklist:
+            cell = self._worklist.popleft()
+            self._queued.discard(cell)
+            unknown, count = self._constraint(cell)
+            if not unknown:
+                self._open.discard(cell)
+                continue
+            if count == 0:
+                self._decide(unknown, False)
+                continue
+            if count == len(unknown):
+                self._decide(unknown, True)
+                continue
+            for other in self._nearby_numbers(cell):
+                other_unknown, other_count = self._constraint(other)
+                if not unknown & other_unknown:
+                    continue
+                only_here = unknown - other_unknown
+                only_there = other_unknown - unknown
+                # the shared cells hold at least count - len(only_here) mines
+                # and at most other_count of them; when the two bounds meet,
+                # both sides are fully decided (this covers the subset rules)
+                if count - other_count == len(only_here):
+                    self._decide(only_here, True)
+                    self._decide(only_there, False)
+                elif other_count - count == len(only_there):
+                    self._decide(only_there, True)
+                    self._decide(only_here, False)
+                else:
+                    continue
+                break
+
+    def get_safe_cell(self):
+        """ Return a covered cell that is provably safe, or None """
+        move = self.next_move()
+        if move[0] == REVEAL and not move[2]:
+            return move[1]
+        return None
+
+    def get_probabilities(self):
+        """ Return the mine probability of each covered cell next to a number
+            or already decided, and the probability shared by all the other
+            covered cells. Only the components changed since the last call
+            are counted again. """
+        self.deduce()
+        constraints = set()
+        for cell in list(self._open):
+            unknown, count = self._constraint(cell)
+            if unknown:
+                constraints.add((unknown, count))
+            else:
+                self._open.discard(cell)
+        probabilities = dict.fromkeys(self._mines, 1.0)
+        probabilities.update(dict.fromkeys(self._safe, 0.0))
+        mines_left = self._minefield.get_num_mines() - len(self._mines)
+        interior = self._height * self._width - self._minefield.get_num_revealed() - len(probabilities)
+
+        layouts = {}
+        results = []
+        for component in split_components(constraints):
+            if component in self._layouts:
+                result = self._layouts[component]
+            else:
+                result = count_layouts(component)
+            layouts[component] = result
+            cells = set()
+            for unknown, count in component:
+                cells.update(unknown)
+            interior -= len(cells)
+            if result is not None:
+                results.append(result)
+                continue
+            # too many layouts to count: judge each cell by its numbers alone
+            for cell in cells:
+                chances = [count / len(unknown) for unknown, count in component if cell in unknown]
+                probabilities[cell] = sum(chances) / len(chances)
+                mines_left -= probabilities[cell]
+        self._layouts = layouts     # components that changed drop out
+        frontier, interior_chance = combine_components(results, interior,
+                                                       int(round(mines_left)))
+        probabilities.update(frontier)
+        return probabilities, interior_chance
+
+    def next_move(self):
+        """ Return the next (action, cell, is_guess) to play """
+        if self._game.get_state() == engine.READY:
+            # the first click never hits a mine
+            return (REVEAL, (self._height // 2, self._width // 2), False)
+        self.deduce()
+        while self._to_reveal:
+            cell = self._to_reveal[0]
+            if cell in self._safe:      # revealed cells leave the set through update
+                return (REVEAL, cell, False)
+            self._to_reveal.popleft()
+        while self._to_flag:
+            cell = self._to_flag.popleft()
+            if not self._game.is_flagged(cell):
+                return (FLAG, cell, False)
+        for cell in self._mines:        # in case a player took a flag off again
+            if not self._game.is_flagged(cell):
+                return (FLAG, cell, False)
+        return self._guess()
+
+    def _guess(self):
+        """ Reveal the covered cell least likely to be a mine. When the mine
+            count shows that it cannot be one, this is no guess. """
+        probabilities, interior_chance = self.get_probabilities()
+        best = None
+        for cell, chance in probabilities.items():
+            if chance < 1.0 and (best is None or (chance, cell) < best):
+                best = (chance, cell)
+        if best is None or interior_chance < best[0]:
+            cell = self._random_interior(probabilities)
+            if cell is not None:
+                return (REVEAL, cell, interior_chance > 0.0)
+        return (REVEAL, best[1], best[0] > 0.0)
+
+    def _random_interior(self, probabilities):
+        """ Return a random covered cell away from the numbers, or None """
+        for probe in range(RANDOM_PROBES):
+            cell = (self._rng.randrange(self._height), self._rng.randrange(self._width))
+            if self._is_interior(cell, probabilities):
+                return cell
+        candidates = [(row, col) for row in range(self._height) for col in range(self._width)
+                      if self._is_interior((row, col), probabilities)]
+        if candidates:
+            return self._rng.choice(candidates)
+        return None
+
+    def _is_interior(self, cell, probabilities):
+        return not self._minefield.is_revealed(cell[0], cell[1]) and cell not in probabilities
+
+    def step(self):
+        """ Play the next move on the game; return (move, changed cells) """
+        move = self.next_move()
+        action, cell, is_guess = move
+        if action == FLAG:
+            return move, self._game.flag(cell)
+        changed = self._game.clear_mark(cell)
+        return move, changed + self._game.reveal(cell)
+
+    def play(self):
+        """ Play until the game is over; return the number of moves and guesses """
+        moves = 0
+        guesses = 0
+        while not self._game.is_over():
+            move, changed = self.step()
+            moves += 1
+            guesses += move[2]
+        return moves, guesses
+
+class Solver_strategy():
+    """ A simulate.py strategy backed by a Solver; one is created per game """
+    def __init__(self):
+        self._solver = None
+
+    def __call__(self, game, rng):
+        if self._solver is None:
+            self._solver = Solver(game, rng)
+        return [self._solver.next_move()]
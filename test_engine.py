@@ -0,0 +1,130 @@
+"""
+Tests of the game logic of engine.py:
+
+    python -m pytest
+"""
+
+import unittest
+import engine
+
+class ChunkedMinefieldTest(unittest.TestCase):
+    def setUp(self):
+        self._chunk_size = engine.CHUNK_SIZE
+        engine.CHUNK_SIZE = 8   # small tiles, so that small boards have several
+
+    def tearDown(self):
+        engine.CHUNK_SIZE = self._chunk_size
+
+    def test_places_every_mine(self):
+        """ The safe zone must not eat into the mines of the tiles it lies in """
+        for height, width in ((1, 11), (3, 5), (9, 13), (2, 17), (17, 9)):
+            for safe_zone in (engine.SAFE_CELL, engine.SAFE_NEIGHBORHOOD):
+                for seed in range(3):
+                    cell = (seed * 7 % height, seed * 5 % width)
+                    zone = set([cell])
+                    if safe_zone == engine.SAFE_NEIGHBORHOOD:
+                        zone.update(engine.Minefield(height, width, 0).get_neighbors(*cell))
+                    for num_mines in range(height * width - len(zone) + 1):
+                        minefield = engine.ChunkedMinefield(height, width, num_mines, seed=seed,
+                                                            safe_zone=safe_zone)
+                        minefield.build_grid(cell)
+                        mines = minefield._mine_locs
+                        self.assertEqual(len(mines), num_mines)
+                        self.assertFalse(set(mines) & zone)
+
+    def test_too_many_mines(self):
+        minefield = engine.ChunkedMinefield(3, 3, 1, safe_zone=engine.SAFE_NEIGHBORHOOD)
+        self.assertRaises(ValueError, minefield.build_grid, (1, 1))
+
+    def test_can_be_won(self):
+        game = engine.GameEngine()
+        # the first click leaves the second tile no room for its share
+        game.new_game(1, 11, 2, seed=1, safe_zone=engine.SAFE_NEIGHBORHOOD, chunked=True)
+        game.reveal((0, 9))
+        for col in range(11):
+            if game.get_minefield().get_cell(0, col) != 9:
+                game.reveal((0, col))
+        self.assertEqual(game.get_state(), engine.WON)
+
+    def test_seed_mines_takes_a_seed(self):
+        minefield = engine.ChunkedMinefield(20, 20, 60, seed=1)
+        minefield.build_grid((10, 10))
+        minefield.seed_mines(2)
+        self.assertEqual(minefield.get_seed(), 2)
+        other = engine.ChunkedMinefield(20, 20, 60, seed=2)
+        other.build_grid((10, 10))
+        self.assertEqual(minefield._mine_locs, other._mine_locs)
+
+    def test_retrieve_state(self):
+        minefield = engine.ChunkedMinefield(20, 30, 90, seed=3)
+        minefield.build_grid((0, 0))
+        minefield.mass_reveal((0, 0))
+        minefield.reveal((19, 29))
+        mines, revealed = minefield.get_packed_state()
+        saved = {'height': 20, 'width': 30, 'num_mines': 90, 'seed': 3,
+                 'mine_bitmap': mines, 'revealed_bitmap': revealed}
+        restored = engine.ChunkedMinefield(0, 0, 0, saved_field=saved)
+        self.assertEqual(restored.get_minefield(), minefield.get_minefield())
+        self.assertEqual(restored.get_revealed(), minefield.get_revealed())
+        self.assertEqual(restored.get_num_revealed(), minefield.get_num_revealed())
+        # and from the rows of the oldest saves
+        saved = {'height': 20, 'width': 30, 'num_mines': 90, 'minefield': minefield.get_minefield(),
+                 'revealed': minefield.get_revealed(), 'mine_locs': minefield._mine_locs}
+        restored = engine.ChunkedMinefield(0, 0, 0, saved_field=saved)
+        self.assertEqual(restored.get_minefield(), minefield.get_minefield())
+        self.assertEqual(restored.get_num_revealed(), minefield.get_num_revealed())
+
+class GameEngineTest(unittest.TestCase):
+    def test_cells_off_the_board_are_ignored(self):
+        game = engine.GameEngine()
+        game.new_game(9, 9, 10, seed=1)
+        game.reveal((4, 4))
+        status = game.status()
+        for cell in ((4, -1), (-1, 4), (9, 0), (0, 9), (-1, -1)):
+            for move in ('reveal', 'toggle_flag', 'flag', 'clear_mark', 'chord'):
+                self.assertEqual(getattr(game, move)(cell), [])
+        self.assertEqual(game.status(), status)
+
+    def test_listeners_can_be_removed(self):
+        game = engine.GameEngine()
+        changes = []
+        moves = []
+        game.add_listener(changes.append)
+        record = lambda move, cell: moves.append((move, cell))
+        game.add_move_listener(record)
+        game.new_game(9, 9, 10, seed=1)
+        game.toggle_flag((0, 0))
+        self.assertEqual(changes, [None, [(0, 0)]])
+        self.assertEqual(moves, [('toggle_flag', (0, 0))])
+        game.remove_listener(changes.append)
+        game.remove_move_listener(record)
+        game.toggle_flag((0, 0))
+        game.new_game(9, 9, 10, seed=1)
+        self.assertEqual(changes, [None, [(0, 0)]])
+        self.assertEqual(moves, [('toggle_flag', (0, 0))])
+
+    def test_clear_mark_can_win(self):
+        """ Taking off the only wrong flag wins once every mine is flagged """
+        game = engine.GameEngine()
+        game.new_game(9, 9, 10, seed=1)
+        game.reveal((4, 4))
+        moves = []
+        game.add_move_listener(lambda move, cell: moves.append((move, cell)))
+        minefield = game.get_minefield()
+        cells = [(row, col) for row in range(9) for col in range(9)]
+        wrong = [cell for cell in cells
+                 if not minefield.is_revealed(*cell) and minefield.get_cell(*cell) != 9][0]
+        game.flag(wrong)
+        for cell in cells:
+            if minefield.get_cell(*cell) == 9:
+                game.flag(cell)
+        self.assertEqual(game.get_state(), engine.PLAYING)
+        before = game.status()['moves']
+        self.assertEqual(game.clear_mark(wrong), [wrong])
+        self.assertEqual(game.get_state(), engine.WON)
+        self.assertEqual(game.status()['moves'], before + 1)
+        self.assertEqual(moves[-1], ('clear_mark', wrong))
+        self.assertFalse(game.get_params().is_question(wrong))
+
+if __name__ == '__main__':
+    unittest.main()
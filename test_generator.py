@@ -0,0 +1,42 @@
+"""
+Tests of the no-guess board generator, generator.py:
+
+    python -m pytest
+"""
+
+import multiprocessing, unittest
+import engine, generator
+
+class GeneratorTest(unittest.TestCase):
+    def test_finds_a_no_guess_seed(self):
+        finder = generator.Generator(processes=2)
+        try:
+            seed = finder.find_seed(9, 9, 10, (4, 4))
+        finally:
+            finder.close()
+        self.assertTrue(generator.is_no_guess(9, 9, 10, seed, (4, 4)))
+
+    def test_worker_error_is_raised(self):
+        """ A batch that raises in a worker must not leave find_seed waiting """
+        finder = generator.Generator(processes=2)
+        try:
+            # more mines than cells, so every worker raises a ValueError
+            self.assertRaises(RuntimeError, finder.find_seed, 3, 3, 20, (1, 1))
+        finally:
+            finder.close()
+
+    def test_stale_batch_stops(self):
+        """ Batches of a board whose seed was found stop at their next seed """
+        generator.init_worker(multiprocessing.RawValue('i', 2))
+        try:
+            self.assertEqual(generator.try_seeds((16, 30, 99, [1, 2, 3], (8, 15),
+                                                  engine.SAFE_NEIGHBORHOOD, 1)), (None, 0))
+        finally:
+            generator.init_worker(None)
+
+    def test_error_in_process(self):
+        finder = generator.Generator(processes=1)
+        self.assertRaises(ValueError, finder.find_seed, 3, 3, 20, (1, 1))
+
+if __name__ == '__main__':
+    unittest.main()